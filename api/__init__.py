@@ -0,0 +1,180 @@
+# ----------------------------------------------------------------------------#
+# API : versioned JSON endpoints over venues, artists, shows and albums.
+#
+# GET /api/v1/<resource>?fields=id,name&limit=50&after=<id>
+# GET /api/v1/<resource>/<id>?fields=id,name
+#
+# ?fields= selects only the requested columns (joins included), rows are
+# paged by id with a keyset cursor and serialized without building models.
+# ----------------------------------------------------------------------------#
+from collections import namedtuple
+
+import orjson
+from flask import Blueprint, Response, abort, current_app, request, url_for
+
+from models import db, Venue, Artist, Show, Album
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# fields : name -> column, joins : field -> (model, onclause) it needs,
+# filters : query string arguments matched against a column
+Resource = namedtuple('Resource', 'model fields default_fields joins filters')
+
+VENUE_FIELDS = {
+    'id': Venue.id,
+    'name': Venue.name,
+    'city': Venue.city,
+    'state': Venue.state,
+    'address': Venue.address,
+    'phone': Venue.phone,
+    'genres': Venue.genres,
+    'image_link': Venue.image_link,
+    'facebook_link': Venue.facebook_link,
+    'website_link': Venue.website_link,
+    'seeking_talent': Venue.seeking_talent,
+    'seeking_description': Venue.seeking_description,
+    'num_upcoming_shows': Venue.upcoming_show_count,
+}
+
+ARTIST_FIELDS = {
+    'id': Artist.id,
+    'name': Artist.name,
+    'city': Artist.city,
+    'state': Artist.state,
+    'phone': Artist.phone,
+    'genres': Artist.genres,
+    'image_link': Artist.image_link,
+    'facebook_link': Artist.facebook_link,
+    'website_link': Artist.website_link,
+    'seeking_venue': Artist.seeking_venue,
+    'seeking_description': Artist.seeking_description,
+    'num_upcoming_shows': Artist.upcoming_show_count,
+    'num_albums': Artist.album_count,
+}
+
+SHOW_FIELDS = {
+    'id': Show.id,
+    'venue_id': Show.venue_id,
+    'artist_id': Show.artist_id,
+    'start_time': Show.start_time,
+    'end_time': Show.end_time,
+    'venue_name': Venue.name,
+    'artist_name': Artist.name,
+    'artist_image_link': Artist.image_link,
+}
+
+ALBUM_FIELDS = {
+    'id': Album.id,
+    'artist_id': Album.artist_id,
+    'name': Album.name,
+    'release_date': Album.release_date,
+    'image_link': Album.image_link,
+    'num_tracks': Album.track_count,
+    'artist_name': Artist.name,
+}
+
+RESOURCES = {
+    'venues': Resource(Venue, VENUE_FIELDS, ('id', 'name', 'city', 'state', 'num_upcoming_shows'), {}, {}),
+    'artists': Resource(Artist, ARTIST_FIELDS, ('id', 'name', 'city', 'state', 'num_upcoming_shows'), {}, {}),
+    'shows': Resource(Show, SHOW_FIELDS, ('id', 'venue_id', 'artist_id', 'start_time'), {
+        'venue_name': (Venue, Venue.id == Show.venue_id),
+        'artist_name': (Artist, Artist.id == Show.artist_id),
+        'artist_image_link': (Artist, Artist.id == Show.artist_id),
+    }, {'venue_id': Show.venue_id, 'artist_id': Show.artist_id}),
+    'albums': Resource(Album, ALBUM_FIELDS, ('id', 'artist_id', 'name', 'release_date', 'num_tracks'), {
+        'artist_name': (Artist, Artist.id == Album.artist_id),
+    }, {'artist_id': Album.artist_id}),
+}
+
+
+@api.route('/<resource>')
+def list_resource(resource):
+    resource = get_resource(resource)
+    fields = get_fields(resource, request)
+    limit = min(max(request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int), 1),
+                current_app.config['API_MAX_PAGE_SIZE'])
+
+    query = select_fields(resource, fields)
+    for name, column in resource.filters.items():
+        value = request.args.get(name, type=int)
+        if value is not None:
+            query = query.filter(column == value)
+    after = request.args.get('after', type=int)
+    if after is not None:
+        query = query.filter(resource.model.id > after)
+
+    # fetch one extra row to know whether there is a next page
+    rows = query.order_by(resource.model.id).limit(limit + 1).all()
+
+    next_url = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        args = request.args.to_dict()
+        args['after'] = rows[-1][0]
+        next_url = url_for('api.list_resource', resource=request.view_args['resource'], **args)
+
+    return json_response({'data': [serialize(fields, row) for row in rows], 'next': next_url})
+
+
+@api.route('/<resource>/<int:id>')
+def get_resource_item(resource, id):
+    resource = get_resource(resource)
+    fields = get_fields(resource, request)
+    row = select_fields(resource, fields).filter(resource.model.id == id).first()
+    if row is None:
+        abort(404, description=f'{request.view_args["resource"][:-1].capitalize()} {id} not found')
+    return json_response({'data': serialize(fields, row)})
+
+
+def api_error(error):
+    # json errors instead of the html error pages
+    response = json_response({'error': {'code': error.code, 'message': error.description}})
+    response.status_code = error.code
+    return response
+
+
+# registered per code, the application's own 404 and 500 handlers would win otherwise
+for code in (400, 404, 405, 500):
+    api.register_error_handler(code, api_error)
+
+
+def get_resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        abort(404, description=f'Unknown resource {name!r}')
+    return resource
+
+
+def get_fields(resource, request):
+    # ?fields=id,name ; the id always comes first, it is the paging cursor
+    fields = request.args.get('fields')
+    if not fields:
+        return ['id'] + [field for field in resource.default_fields if field != 'id']
+
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in resource.fields]
+    if unknown:
+        abort(400, description=f'Unknown fields {", ".join(unknown)}; available: {", ".join(resource.fields)}')
+    return ['id'] + [field for field in dict.fromkeys(fields) if field != 'id']
+
+
+def select_fields(resource, fields):
+    # a narrow select of the requested columns, joining only what they need
+    query = db.session.query(*[resource.fields[field] for field in fields]).select_from(resource.model)
+    joined = set()
+    for field in fields:
+        if field in resource.joins:
+            model, onclause = resource.joins[field]
+            if model not in joined:
+                query = query.join(model, onclause)
+                joined.add(model)
+    return query
+
+
+def serialize(fields, row):
+    return dict(zip(fields, row))
+
+
+def json_response(data):
+    # orjson writes dates and datetimes in ISO 8601 itself
+    return Response(orjson.dumps(data), mimetype='application/json')
@@ -2,15 +2,40 @@
 # Imports
 # ----------------------------------------------------------------------------#
 
+import io
+import json
 import logging
+import time
+from itertools import groupby
 from logging import Formatter, FileHandler
 
-from flask import Flask, render_template, request, flash, redirect, url_for, jsonify, abort
+import click
+from flask import Flask, Response, render_template, request, flash, redirect, url_for, jsonify, abort, \
+    stream_with_context, get_flashed_messages
+from flask.signals import before_render_template, template_rendered
+from flask.cli import AppGroup
 from flask_migrate import Migrate
 from flask_moment import Moment
 
+from api import api
+from bulk import admin_required
+from bulk.exporter import EXPORTS, FORMATS as EXPORT_FORMATS, export_chunks
+from bulk.importer import IMPORTS, FORMATS, import_rows, guess_format
+from cache import ResponseCache, conditional
+from feeds import venue_calendar, artist_calendar
 from forms import *
 from models import *
+from search import *
+from search.autocomplete import AutocompleteIndex
+from models.counters import roll_forward, rebuild_counters
+from models.schedule import with_end_time, expand_shows, find_conflicts, is_double_booking
+from models.timeline import venue_timeline, artist_timeline
+from models.versions import venue_etag, artist_etag, album_etag
+from models.tracklist import insert_songs, remove_songs, reorder_songs
+from telemetry.metrics import Metrics
+from telemetry.profiler import Profiler
+from telemetry.sql import SQLInstrumentation
+from telemetry.traffic import TrafficCapture
 from utils import *
 
 # ----------------------------------------------------------------------------#
@@ -22,22 +47,31 @@ moment = Moment(app)
 app.config.from_object('config')
 db.init_app(app)
 migrate = Migrate(app, db)
+app.register_blueprint(api)
 
 app.jinja_env.filters['datetime'] = format_datetime
 app.jinja_env.filters['timedelta'] = timedelta
 
+autocomplete_index = AutocompleteIndex(app, max_age=app.config['AUTOCOMPLETE_MAX_AGE'])
+response_cache = ResponseCache(app)
+sql_instrumentation = SQLInstrumentation(app)
+metrics = Metrics(app)
+traffic_capture = TrafficCapture(app)
+profiler = Profiler(app)
+
 
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
 @app.route('/')
+@response_cache.cached(lambda: ['venues', 'artists'])
 def index():
     # retrieve 5 most recent artists from database
-    latest_artists = Artist.query.order_by(Artist.id.desc()).limit(5)
+    latest_artists = Artist.query.profile('listing').order_by(Artist.id.desc()).limit(5)
 
     # retrieve 5 most recent venues from database
-    latest_venues = Venue.query.order_by(Venue.id.desc()).limit(5)
+    latest_venues = Venue.query.profile('listing').order_by(Venue.id.desc()).limit(5)
     return render_template('pages/home.html', latest_artists=latest_artists, latest_venues=latest_venues)
 
 
@@ -45,59 +79,30 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@response_cache.cached(lambda: ['venues', 'shows'])
 def venues():
-    # fetch all venues from db
-    db_venues = Venue.query.all()
-
-    # group venues by city and state
-    data = []
-
-    # for each venue in venues
-    for venue in db_venues:
-        # extract city
-        city = venue.city
-
-        # extract state
-        state = venue.state
-
-        # build venue venues data
-        venue_data = {
-            'id': venue.id,
-            'name': venue.name,
-            'num_upcoming_shows': venue.num_upcoming_shows,
-        }
-
-        # check if city and state already in data, if not add it
-        if not any(d['city'] == city and d['state'] == state for d in data):
-            data.append({
-                'city': city,
-                'state': state,
-                'venues': [venue_data]
-            })
-        # if city and state already in data, add venue data to existing city and state
-        else:
-            for d in data:
-                if d['city'] == city and d['state'] == state:
-                    d['venues'].append(venue_data)
-                    break
+    # fetch (city, state, id, name, num_upcoming_shows) rows in a single query
+    rows = Venue.query.with_entities(
+        Venue.city,
+        Venue.state,
+        Venue.id,
+        Venue.name,
+        Venue.upcoming_show_count.label('num_upcoming_shows')
+    ).order_by(Venue.state, Venue.city)
+    rows = by_popularity(rows, Venue, request).order_by(Venue.id)
+    rows = rows.yield_per(app.config['LISTING_STREAM_BATCH_SIZE'])
 
-    return render_template('pages/venues.html', areas=data)
+    return stream_template('pages/venues.html', areas=group_venues_by_area(rows))
 
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
     # get search term from form data
     search_term = request.form.get('search_term', '')
-    city, state = get_search_parts(request)
 
-    if city and state:
-        # get venues from db that match search term
-        venues_results = Venue.query.filter(Venue.city.ilike(f'%{city}%')).filter(
-            Venue.state.ilike(f'%{state}%')).all()
-    else:
-        # search for venues whose name contains search term
-        venues_results = Venue.query.with_entities(Venue.id, Venue.name, Venue.shows).filter(
-            Venue.name.ilike('%' + search_term + '%')).all()
+    # matching venues, best matches first, with their num of upcoming shows
+    count, venues_results = search_catalog(Venue, search_term, app.config['SEARCH_RESULTS_LIMIT'],
+                                           app.config['SEARCH_COUNT_LIMIT'])
 
     # build venues results mapped data
     data = []
@@ -113,7 +118,7 @@ def search_venues():
 
     # build final response data
     response = {
-        "count": len(data),
+        "count": count_label(count, app.config['SEARCH_COUNT_LIMIT']),
         "data": data
     }
 
@@ -123,45 +128,40 @@ def search_venues():
 
 
 @app.route('/venues/<int:venue_id>')
+@conditional(venue_etag)
+@response_cache.cached(lambda venue_id: [f'venue:{venue_id}', 'artists'])
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
 
     # retrieve venue that matches the venue_id
-    venue = Venue.query.get_or_404(venue_id)
+    venue = Venue.query.profile('detail').get_or_404(venue_id)
 
-    # retrieve upcoming shows for venue
-    upcoming_shows = Show.query.with_entities(
-        Show.artist_id,
-        Show.venue_id,
-        Artist.name.label('artist_name'),
-        Artist.image_link.label('artist_image_link'),
-        Show.start_time
-    ).join(Artist, Artist.id == Show.artist_id).filter(Show.venue_id == venue_id).filter(
-        Show.start_time > datetime.now()).all()
-
-    # retrieve past shows for venue
-    past_shows = Show.query.with_entities(
-        Show.artist_id,
-        Show.venue_id,
-        Artist.name.label('artist_name'),
-        Artist.image_link.label('artist_image_link'),
-        Show.start_time
-    ).join(Artist, Artist.id == Show.artist_id).filter(Show.venue_id == venue.id).filter(
-        Show.start_time < datetime.now()).all()
+    # retrieve one page of upcoming and past shows for venue
+    upcoming_page, past_page = get_timeline_pages(request)
+    timeline = venue_timeline(venue_id, app.config['SHOWS_PER_PAGE'], upcoming_page, past_page)
 
     # build venue data
     data = {
         **venue.__dict__,
+        **timeline._asdict(),
         **{
-            'upcoming_shows': upcoming_shows,
-            'upcoming_shows_count': len(upcoming_shows),
-            'past_shows': past_shows,
-            'past_shows_count': len(past_shows)
-        }}
+            'upcoming_page': upcoming_page,
+            'past_page': past_page,
+            'per_page': app.config['SHOWS_PER_PAGE']
+        }
+    }
 
     return render_template('pages/show_venue.html', venue=data)
 
 
+@app.route('/venues/<int:venue_id>/calendar.ics')
+@response_cache.versioned(venue_etag, ttl=app.config['CALENDAR_CACHE_TTL'])
+def venue_calendar_feed(venue_id):
+    # the venue's shows as an iCalendar feed, cached until one of them changes
+    venue = Venue.query.profile('listing').get_or_404(venue_id)
+    return Response(stream_with_context(venue_calendar(venue)), mimetype='text/calendar')
+
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -185,12 +185,14 @@ def create_venue_submission():
             # add new venue to db
             db.session.add(venue)
             db.session.commit()
+            autocomplete_index.add('venue', venue.id, venue.name)
+            response_cache.invalidate('venues')
 
             # flash success message
             flash('Venue ' + request.form['name'] + ' was successfully listed!')
         except Exception as e:
             db.session.rollback()
-            print(e)
+            app.logger.exception(e)
             # flash error message
             flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
         finally:
@@ -202,21 +204,23 @@ def create_venue_submission():
     return redirect(url_for('index'))
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@app.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     # retrieve venue that matches the venue_id
-    venue = Venue.query.get_or_404(venue_id)
+    venue = Venue.query.profile('edit').get_or_404(venue_id)
     error = False
     try:
         # delete venue from db
         db.session.delete(venue)
         db.session.commit()
+        autocomplete_index.remove('venue', venue_id)
+        response_cache.invalidate('venues', f'venue:{venue_id}', 'shows')
         # flash success message
         flash('Venue ' + venue.name + ' was successfully deleted!')
     except Exception as e:
         db.session.rollback()
         error = True
-        print(e)
+        app.logger.exception(e)
         # flash error message
         flash('An error occurred. Venue ' + venue.name + ' could not be deleted.')
     finally:
@@ -230,89 +234,78 @@ def delete_venue(venue_id):
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
+@response_cache.cached(lambda: ['artists', 'shows'])
 def artists():
-    data = Artist.query.with_entities(Artist.id, Artist.name).all()
-    return render_template('pages/artists.html', artists=data)
+    data = Artist.query.with_entities(Artist.id, Artist.name)
+    data = by_popularity(data, Artist, request).order_by(Artist.id)
+    data = data.yield_per(app.config['LISTING_STREAM_BATCH_SIZE'])
+    return stream_template('pages/artists.html', artists=data)
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
     # search term from form data
     search_term = request.form.get('search_term', '')
-    city, state = get_search_parts(request)
 
-    # if city and state are specified, search for artists in that city and state
-    if city and state:
-        # get artists from db that match search term
-        artists_results = Artist.query.filter(Artist.city.ilike(f'%{city}%')).filter(
-            Artist.state.ilike(f'%{state}%')).all()
-    else:
-        # search for artists whose name contains search term
-        artists_results = Artist.query.with_entities(Artist.id, Artist.name, Artist.shows).filter(
-            Artist.name.ilike('%' + search_term + '%')).all()
+    # matching artists, best matches first, with their num of upcoming shows
+    count, artists_results = search_catalog(Artist, search_term, app.config['SEARCH_RESULTS_LIMIT'],
+                                            app.config['SEARCH_COUNT_LIMIT'])
 
-    # num of upcoming shows for each artist
     data = []
     for artist in artists_results:
-        num_upcoming_shows = Show.query.filter_by(artist_id=artist.id).filter(Show.start_time > datetime.now()).count()
         data.append({
             'id': artist.id,
             'name': artist.name,
-            'num_upcoming_shows': num_upcoming_shows
+            'num_upcoming_shows': artist.num_upcoming_shows
         })
 
     response = {
-        "count": len(artists_results),
+        "count": count_label(count, app.config['SEARCH_COUNT_LIMIT']),
         "data": data
     }
 
     return render_template('pages/search_artists.html', results=response,
-                           search_term=request.form.get('search_term', ''))
+                           search_term=search_term)
 
 
 @app.route('/artists/<int:artist_id>')
+@conditional(artist_etag)
+@response_cache.cached(lambda artist_id: [f'artist:{artist_id}', 'venues'])
 def show_artist(artist_id):
     # shows the artist page with the given artist_id
-    artist = Artist.query.get_or_404(artist_id)
-
-    # upcoming shows for artist
-    upcoming_shows = Show.query.with_entities(
-        Show.venue_id,
-        Venue.name.label('venue_name'),
-        Venue.image_link.label('venue_image_link'),
-        Show.start_time
-    ).join(Venue, Venue.id == Show.venue_id).filter(Show.artist_id == artist_id).filter(
-        Show.start_time > datetime.now()
-    ).all()
+    artist = Artist.query.profile('detail').get_or_404(artist_id)
 
-    # past shows for artist
-    past_shows = Show.query.with_entities(
-        Show.venue_id,
-        Venue.name.label('venue_name'),
-        Venue.image_link.label('venue_image_link'),
-        Show.start_time
-    ).join(Venue, Venue.id == Show.venue_id).filter(Show.artist_id == artist_id).filter(
-        Show.start_time < datetime.now()).all()
+    # one page of upcoming and past shows for artist
+    upcoming_page, past_page = get_timeline_pages(request)
+    timeline = artist_timeline(artist_id, app.config['SHOWS_PER_PAGE'], upcoming_page, past_page)
 
     data = {
         **artist.__dict__,
+        **timeline._asdict(),
         **{
-            'upcoming_shows': upcoming_shows,
-            'upcoming_shows_count': len(upcoming_shows),
-            'past_shows': past_shows,
-            'past_shows_count': len(past_shows),
-            'released_albums_count': len(artist.albums)
+            'upcoming_page': upcoming_page,
+            'past_page': past_page,
+            'per_page': app.config['SHOWS_PER_PAGE'],
+            'released_albums_count': artist.album_count
         }
     }
 
     return render_template('pages/show_artist.html', artist=data)
 
 
+@app.route('/artists/<int:artist_id>/calendar.ics')
+@response_cache.versioned(artist_etag, ttl=app.config['CALENDAR_CACHE_TTL'])
+def artist_calendar_feed(artist_id):
+    # the artist's shows as an iCalendar feed, cached until one of them changes
+    artist = Artist.query.profile('listing').get_or_404(artist_id)
+    return Response(stream_with_context(artist_calendar(artist)), mimetype='text/calendar')
+
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    artist = Artist.query.get_or_404(artist_id)
+    artist = Artist.query.profile('edit').get_or_404(artist_id)
     # fill form with artist data
     form = ArtistForm(obj=artist)
     return render_template('forms/edit_artist.html', form=form, artist=artist)
@@ -321,7 +314,7 @@ def edit_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # retrieve artist with artist_id
-    artist = Artist.query.get_or_404(artist_id)
+    artist = Artist.query.profile('edit').get_or_404(artist_id)
     # retrieve artist form data
     form = ArtistForm(request.form)
 
@@ -329,10 +322,12 @@ def edit_artist_submission(artist_id):
         # update artist with form data
         form.populate_obj(artist)
         db.session.commit()
+        autocomplete_index.update('artist', artist_id, form.name.data)
+        response_cache.invalidate('artists', f'artist:{artist_id}')
         flash('Artist ' + request.form['name'] + ' was successfully updated!')
     except Exception as e:
         db.session.rollback()
-        print(e)
+        app.logger.exception(e)
         flash('An error occurred. Artist ' + request.form['name'] + ' could not be updated.')
     finally:
         db.session.close()
@@ -342,7 +337,7 @@ def edit_artist_submission(artist_id):
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    venue = Venue.query.get_or_404(venue_id)
+    venue = Venue.query.profile('edit').get_or_404(venue_id)
     form = VenueForm(obj=venue)
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
@@ -350,7 +345,7 @@ def edit_venue(venue_id):
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # retrieve venue with venue_id or 404
-    venue = Venue.query.get_or_404(venue_id)
+    venue = Venue.query.profile('edit').get_or_404(venue_id)
     # retrieve venue form data
     form = VenueForm(request.form)
     # check if form is valid
@@ -359,10 +354,12 @@ def edit_venue_submission(venue_id):
             # update venue with form data
             form.populate_obj(venue)
             db.session.commit()
+            autocomplete_index.update('venue', venue_id, form.name.data)
+            response_cache.invalidate('venues', f'venue:{venue_id}')
             flash('Venue ' + request.form['name'] + ' was successfully updated!')
         except Exception as e:
             db.session.rollback()
-            print(e)
+            app.logger.exception(e)
             flash('An error occurred. Venue ' + request.form['name'] + ' could not be updated.')
         finally:
             db.session.close()
@@ -392,11 +389,13 @@ def create_artist_submission():
             artist = Artist(**form.data)
             db.session.add(artist)
             db.session.commit()
+            autocomplete_index.add('artist', artist.id, artist.name)
+            response_cache.invalidate('artists')
             # on successful db insert, flash success
             flash('Artist ' + request.form['name'] + ' was successfully listed!')
         except Exception as e:
             db.session.rollback()
-            print(e)
+            app.logger.exception(e)
             flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
         finally:
             db.session.close()
@@ -409,14 +408,16 @@ def create_artist_submission():
 
 @app.route('/artists/<int:artist_id>/delete', methods=['DELETE'])
 def delete_artist(artist_id):
-    artist = Artist.query.get_or_404(artist_id)
+    artist = Artist.query.profile('edit').get_or_404(artist_id)
     try:
         db.session.delete(artist)
         db.session.commit()
+        autocomplete_index.remove('artist', artist_id)
+        response_cache.invalidate('artists', f'artist:{artist_id}', 'shows')
         flash('Artist ' + artist.name + ' was successfully deleted!')
     except Exception as e:
         db.session.rollback()
-        print(e)
+        app.logger.exception(e)
         flash('An error occurred. Artist ' + artist.name + ' could not be deleted.')
     finally:
         db.session.close()
@@ -424,25 +425,72 @@ def delete_artist(artist_id):
     return jsonify({'success': True})
 
 
+#  Autocomplete
+#  ----------------------------------------------------------------
+
+@app.route('/autocomplete')
+def autocomplete():
+    # suggests artist and venue names from the in-memory prefix index
+    prefix = request.args.get('q', '')
+    kind = request.args.get('type')
+    if kind not in (None, 'artist', 'venue'):
+        abort(400)
+    limit = min(request.args.get('limit', 10, type=int), 50)
+
+    return jsonify({'data': autocomplete_index.complete(prefix, kind=kind, limit=limit)})
+
+
+#  Response cache
+#  ----------------------------------------------------------------
+
+@app.route('/cache/stats')
+def cache_stats():
+    # hit and miss counters of the response cache, per endpoint
+    return jsonify(response_cache.stats())
+
+
 #  Shows
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@response_cache.cached(lambda: ['shows', 'venues', 'artists'])
 def shows():
-    # displays list of shows at /shows
-    data = Show.query.with_entities(
-        Show.venue_id,
-        Show.artist_id,
-        Artist.name.label('artist_name'),
-        Venue.name.label('venue_name'),
-        Artist.image_link.label('artist_image_link'),
-        Show.start_time
-    ).join(
-        Venue,
-        Venue.id == Show.venue_id
-    ).join(Artist, Artist.id == Show.artist_id).all()
+    # displays list of shows at /shows, one page at a time
+    cursor = get_shows_cursor(request)
+    per_page = app.config['SHOWS_PER_PAGE']
+
+    query = shows_listing_query()
+    if cursor:
+        # keyset pagination : resume right after the last (start_time, id) seen
+        query = query.filter(db.tuple_(Show.start_time, Show.id) > cursor)
+
+    # the pager is rendered after the rows, once the page has been consumed
+    pager = {'paginated': cursor is not None, 'next_cursor': None}
+    return stream_template('pages/shows.html', shows=keyset_page(query, per_page, pager), pager=pager)
+
+
+@app.route('/shows.json')
+def shows_json():
+    # streams every show as a json array without holding the table in memory
+    query = shows_listing_query().yield_per(app.config['SHOWS_STREAM_BATCH_SIZE'])
+
+    def generate():
+        yield '['
+        separator = ''
+        for show in query:
+            yield separator + json.dumps({
+                'id': show.id,
+                'venue_id': show.venue_id,
+                'venue_name': show.venue_name,
+                'artist_id': show.artist_id,
+                'artist_name': show.artist_name,
+                'artist_image_link': show.artist_image_link,
+                'start_time': show.start_time.isoformat()
+            })
+            separator = ','
+        yield ']'
 
-    return render_template('pages/shows.html', shows=data)
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 
 @app.route('/shows/create')
@@ -457,17 +505,44 @@ def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # retrieve show form data
     form = ShowForm(request.form)
+    if not form.validate():
+        return render_template('forms/new_show.html', form=form)
+
+    # a single show, or every date of a residency (recurrence) and of a tour
+    values = with_end_time({name: form.data[name] for name in ('venue_id', 'artist_id', 'start_time', 'end_time')})
+    shows = expand_shows(values, getattr(form.recurrence, 'occurrences', None), form.tour.data or ())
+    if len(shows) > app.config['SHOW_BATCH_MAX']:
+        form.tour.errors.append(f'At most {app.config["SHOW_BATCH_MAX"]} shows can be listed at once.')
+        return render_template('forms/new_show.html', form=form)
+
+    conflicts = find_conflicts(shows)
+    if conflicts:
+        for index, messages in sorted(conflicts.items()):
+            if len(shows) > 1:
+                messages = [f'{shows[index]["start_time"]} at venue {shows[index]["venue_id"]} : {message}'
+                            for message in messages]
+            form.start_time.errors.extend(messages)
+        return render_template('forms/new_show.html', form=form)
 
     try:
-        show = Show(**form.data)
-        db.session.add(show)
+        # all the dates in one multi-row insert and one transaction
+        db.session.execute(Show.__table__.insert().values(shows))
         db.session.commit()
+        response_cache.invalidate('shows', f'artist:{form.artist_id.data}',
+                                  *{f'venue:{show["venue_id"]}' for show in shows})
         # on successful db insert, flash success
-        flash('Show was successfully listed!')
+        if len(shows) > 1:
+            flash(f'{len(shows)} shows were successfully listed!')
+        else:
+            flash('Show was successfully listed!')
     except Exception as e:
         db.session.rollback()
-        print(e)
-        flash('An error occurred. Show could not be listed.')
+        app.logger.exception(e)
+        if is_double_booking(e):
+            # booked by a concurrent request since the check
+            flash('Shows could not be listed, the venue or the artist was just booked at that time.')
+        else:
+            flash('An error occurred. Show could not be listed.')
     finally:
         db.session.close()
 
@@ -481,7 +556,7 @@ def create_show_submission():
 @app.route('/artists/<int:artist_id>/albums/create', methods=['GET'])
 def create_album_form(artist_id):
     # retrieve artist with artist_id or 404
-    artist = Artist.query.get_or_404(artist_id)
+    artist = Artist.query.profile('edit').get_or_404(artist_id)
     form = AlbumForm()
     form.artist_id.data = artist.id
     return render_template('forms/new_album.html', form=form, artist=artist)
@@ -490,7 +565,7 @@ def create_album_form(artist_id):
 @app.route('/artists/<int:artist_id>/albums/create', methods=['POST'])
 def create_album_submission(artist_id):
     # retrieve artist with artist_id or 404
-    artist = Artist.query.get_or_404(artist_id)
+    artist = Artist.query.profile('edit').get_or_404(artist_id)
     # retrieve album form data
     form = AlbumForm(request.form)
     form.artist_id.data = artist.id
@@ -501,11 +576,12 @@ def create_album_submission(artist_id):
             album = Album(**form.data)
             db.session.add(album)
             db.session.commit()
+            response_cache.invalidate(f'artist:{artist_id}')
             # on successful db insert, flash success
             flash('Empty Album ' + request.form['name'] + ' was successfully released by ' + artist.name + '! Please add some songs.')
         except Exception as e:
             db.session.rollback()
-            print(e)
+            app.logger.exception(e)
             flash('An error occurred. Album ' + request.form['name'] + ' could not be released.')
         finally:
             db.session.close()
@@ -519,7 +595,7 @@ def create_album_submission(artist_id):
 
 @app.route('/albums/<int:album_id>/edit', methods=['GET'])
 def edit_album_form(album_id):
-    album = Album.query.get_or_404(album_id)
+    album = Album.query.profile('edit').get_or_404(album_id)
     form = AlbumForm(obj=album)
     form.artist_id.data = album.artist_id
     return render_template('forms/edit_album.html', form=form, album=album)
@@ -527,7 +603,7 @@ def edit_album_form(album_id):
 
 @app.route('/albums/<int:album_id>/edit', methods=['POST'])
 def edit_album_submission(album_id):
-    album = Album.query.get_or_404(album_id)
+    album = Album.query.profile('edit').get_or_404(album_id)
     form = AlbumForm(request.form)
     form.artist_id.data = album.artist_id
 
@@ -535,10 +611,11 @@ def edit_album_submission(album_id):
         try:
             form.populate_obj(album)
             db.session.commit()
+            response_cache.invalidate(f'album:{album_id}', f'artist:{form.artist_id.data}')
             flash('Album ' + request.form['name'] + ' was successfully updated!')
         except Exception as e:
             db.session.rollback()
-            print(e)
+            app.logger.exception(e)
             flash('An error occurred. Album ' + request.form['name'] + ' could not be updated.')
         finally:
             db.session.close()
@@ -550,14 +627,16 @@ def edit_album_submission(album_id):
 
 @app.route('/albums/<int:album_id>/delete', methods=['DELETE'])
 def delete_album(album_id):
-    album = Album.query.get_or_404(album_id)
+    album = Album.query.profile('edit').get_or_404(album_id)
+    artist_id = album.artist_id
     try:
         db.session.delete(album)
         db.session.commit()
+        response_cache.invalidate(f'album:{album_id}', f'artist:{artist_id}')
         flash('Album ' + album.name + ' was successfully deleted!')
     except Exception as e:
         db.session.rollback()
-        print(e)
+        app.logger.exception(e)
         flash('An error occurred. Album ' + album.name + ' could not be deleted.')
     finally:
         db.session.close()
@@ -566,8 +645,10 @@ def delete_album(album_id):
 
 
 @app.route('/albums/<int:album_id>', methods=['GET'])
+@conditional(album_etag)
+@response_cache.cached(lambda album_id: [f'album:{album_id}', 'artists'])
 def show_album(album_id):
-    album = Album.query.get_or_404(album_id)
+    album = Album.query.profile('detail').get_or_404(album_id)
     return render_template('pages/show_album.html', album=album)
 
 
@@ -577,7 +658,7 @@ def show_album(album_id):
 
 @app.route('/albums/<int:album_id>/songs/create', methods=['GET'])
 def create_song_form(album_id):
-    album = Album.query.get_or_404(album_id)
+    album = Album.query.profile('edit').get_or_404(album_id)
     form = SongForm()
     form.album_id.data = album.id
     return render_template('forms/new_song.html', form=form, album=album)
@@ -586,7 +667,7 @@ def create_song_form(album_id):
 @app.route('/albums/<int:album_id>/songs/create', methods=['POST'])
 def create_song_submission(album_id):
     # retrieve album
-    album = Album.query.get_or_404(album_id)
+    album = Album.query.profile('edit').get_or_404(album_id)
     # retrieve song form data
     form = SongForm(request.form)
     form.album_id.data = album.id
@@ -594,14 +675,18 @@ def create_song_submission(album_id):
     # check if form is valid
     if form.validate():
         try:
-            song = Song(**form.data)
-            db.session.add(song)
+            data = form.data
+            position = data.pop('position')
+            song = Song(**data)
+            # append the song, or insert it at the requested track number
+            insert_songs(album.id, [song], position)
             db.session.commit()
+            response_cache.invalidate(f'album:{album_id}', f'artist:{album.artist_id}')
             # on successful db insert, flash success
             flash('Song ' + request.form['name'] + ' was successfully added to album ' + album.name + ' !')
         except Exception as e:
             db.session.rollback()
-            print(e)
+            app.logger.exception(e)
             flash(
                 'An error occurred. Song ' + request.form['name'] + ' could not be added to album ' + album.name + '.')
         finally:
@@ -613,6 +698,89 @@ def create_song_submission(album_id):
     return redirect(url_for('show_album', album_id=album.id))
 
 
+@app.route('/albums/<int:album_id>/songs/<int:song_id>/delete', methods=['DELETE'])
+def delete_song(album_id, song_id):
+    # delete the song and move the following tracks up
+    song = Song.query.filter_by(id=song_id, album_id=album_id).first_or_404()
+    name, album = song.name, song.album
+    artist_id = album.artist_id
+    try:
+        remove_songs(album_id, [song_id])
+        db.session.commit()
+        response_cache.invalidate(f'album:{album_id}', f'artist:{artist_id}')
+        flash('Song ' + name + ' was successfully deleted from album ' + album.name + '!')
+    except Exception as e:
+        db.session.rollback()
+        app.logger.exception(e)
+        flash('An error occurred. Song ' + name + ' could not be deleted.')
+    finally:
+        db.session.close()
+
+    return jsonify({'success': True})
+
+
+@app.route('/albums/<int:album_id>/songs/reorder', methods=['POST'])
+def reorder_album_songs(album_id):
+    # renumber the album tracks in the order of the posted song ids
+    album = Album.query.profile('edit').get_or_404(album_id)
+    song_ids = (request.get_json(silent=True) or {}).get('song_ids')
+    if not isinstance(song_ids, list):
+        abort(400)
+
+    try:
+        reorder_songs(album.id, song_ids)
+        db.session.commit()
+        response_cache.invalidate(f'album:{album_id}')
+    except (TypeError, ValueError):
+        db.session.rollback()
+        abort(400)
+    finally:
+        db.session.close()
+
+    return jsonify({'success': True})
+
+
+#  Bulk
+#  ----------------------------------------------------------------
+
+@app.route('/import/<entity>', methods=['POST'])
+@admin_required
+def import_upload(entity):
+    # a csv or ndjson file upload, or the raw request body
+    if entity not in IMPORTS:
+        abort(404)
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+        format = request.args.get('format') or guess_format(upload.filename, upload.mimetype)
+    else:
+        stream = request.stream
+        format = request.args.get('format') or guess_format(None, request.mimetype)
+    if format not in FORMATS:
+        abort(400)
+
+    report = import_rows(entity, io.TextIOWrapper(stream, encoding='utf-8', newline=''), format,
+                         batch_size=app.config['IMPORT_BATCH_SIZE'], max_errors=app.config['IMPORT_MAX_ERRORS'])
+    after_import(entity, report)
+    return jsonify(report.as_dict())
+
+
+@app.route('/export/<entity>')
+@admin_required
+def export_download(entity):
+    # ?format=csv|ndjson|columnar, ?gzip=1 for a compressed file
+    format = request.args.get('format', 'csv')
+    if entity not in EXPORTS or format not in EXPORT_FORMATS:
+        abort(404)
+    compress = request.args.get('gzip', type=int) == 1
+
+    chunks = export_chunks(entity, format, app.config['EXPORT_BATCH_SIZE'], compress=compress)
+    filename = f'{entity}.{"ndjson" if format == "columnar" else format}{".gz" if compress else ""}'
+    return Response(stream_with_context(chunks),
+                    mimetype='application/gzip' if compress else EXPORT_FORMATS[format],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -623,14 +791,175 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-def get_search_parts(request):
-    search_term = request.form.get('search_term', '')
-    search_parts = search_term.strip().replace(', ', ',').split(',')
-    if len(search_parts) == 2:
-        # get city and state from search term
-        city, state = search_parts
-        return city, state
-    return None, None
+def after_import(entity, report):
+    # refresh the autocomplete index and the cached pages the new rows show up on
+    if report.inserted and entity in ('venues', 'artists'):
+        autocomplete_index.refresh()
+    response_cache.invalidate(entity, *(
+        f'{name[:-len("_id")]}:{id}' for name, ids in report.references.items() for id in ids
+    ))
+    if entity == 'shows':
+        response_cache.invalidate('venues', 'artists')
+
+
+def group_venues_by_area(rows):
+    # group venue rows, sorted by state and city, one area at a time
+    for (state, city), venues in groupby(rows, key=lambda row: (row.state, row.city)):
+        yield {
+            'city': city,
+            'state': state,
+            'venues': [{
+                'id': row.id,
+                'name': row.name,
+                'num_upcoming_shows': row.num_upcoming_shows,
+            } for row in venues]
+        }
+
+
+def keyset_page(query, per_page, pager):
+    # yield one page of rows, fetching one extra to set the pager's next cursor
+    last = None
+    for count, row in enumerate(query.limit(per_page + 1), 1):
+        if count > per_page:
+            pager['next_cursor'] = f'{last.start_time.isoformat()},{last.id}'
+            break
+        last = row
+        yield row
+
+
+def stream_template(template_name, **context):
+    # render a template chunk by chunk while its rows are still being fetched
+    app.update_template_context(context)
+    # pop the flashed messages while the session can still be saved, the
+    # template's get_flashed_messages() then reads them from the request
+    get_flashed_messages()
+    template = app.jinja_env.get_template(template_name)
+    before_render_template.send(app, template=template, context=context)
+    stream = template.stream(context)
+    stream.enable_buffering(app.config['TEMPLATE_STREAM_BUFFER'])
+
+    def generate():
+        yield from stream
+        template_rendered.send(app, template=template, context=context)
+
+    return Response(stream_with_context(generate()))
+
+
+def shows_listing_query():
+    # shows joined to their venue and artist, in (start_time, id) order
+    return Show.query.with_entities(
+        Show.id,
+        Show.venue_id,
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Venue.name.label('venue_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.start_time
+    ).join(
+        Venue,
+        Venue.id == Show.venue_id
+    ).join(Artist, Artist.id == Show.artist_id).order_by(Show.start_time, Show.id)
+
+
+def by_popularity(query, model, request):
+    # ?min_upcoming_shows=<n> filter and ?sort=popular ordering on the stored counter
+    min_upcoming_shows = request.args.get('min_upcoming_shows', 0, type=int)
+    if min_upcoming_shows > 0:
+        query = query.filter(model.upcoming_show_count >= min_upcoming_shows)
+    if request.args.get('sort') == 'popular':
+        query = query.order_by(model.upcoming_show_count.desc())
+    return query
+
+
+def get_timeline_pages(request):
+    # upcoming and past shows are paged independently on detail pages
+    upcoming_page = max(request.args.get('upcoming_page', 1, type=int), 1)
+    past_page = max(request.args.get('past_page', 1, type=int), 1)
+    return upcoming_page, past_page
+
+
+def get_shows_cursor(request):
+    # parse the "<start_time>,<id>" keyset cursor from the query string
+    after = request.args.get('after')
+    if not after:
+        return None
+    try:
+        start_time, show_id = after.rsplit(',', 1)
+        return datetime.fromisoformat(start_time), int(show_id)
+    except ValueError:
+        abort(400)
+
+
+# ----------------------------------------------------------------------------#
+# Commands.
+# ----------------------------------------------------------------------------#
+
+counters_cli = AppGroup('counters', help='Maintain the denormalized show, album and track counters.')
+
+
+@counters_cli.command('roll-forward')
+def roll_forward_counters():
+    # move shows that started since the last run from upcoming to past; run from
+    # cron (see the README), the cached listings catch up within RESPONSE_CACHE_TTL
+    updated = roll_forward()
+    click.echo(f'{updated} venue and artist counters rolled forward.')
+
+
+@counters_cli.command('rebuild')
+def rebuild_counters_command():
+    # recompute every counter from scratch
+    rebuild_counters()
+    click.echo('Counters rebuilt.')
+
+
+app.cli.add_command(counters_cli)
+
+
+@app.cli.command('import')
+@click.argument('entity', type=click.Choice(list(IMPORTS)))
+@click.argument('file', type=click.File('r', encoding='utf-8'))
+@click.option('--format', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, default=lambda: app.config['IMPORT_BATCH_SIZE'],
+              show_default='IMPORT_BATCH_SIZE')
+def import_command(entity, file, format, batch_size):
+    """Import venues, artists, shows or albums from a CSV or NDJSON file ('-' for stdin)."""
+    format = format or guess_format(file.name)
+    if format is None:
+        raise click.UsageError('Cannot tell the format from the file name, use --format.')
+
+    def progress(report):
+        click.echo(f'{report.rows} rows, {report.inserted} inserted, {report.error_count} errors, '
+                   f'{report.rows_per_second:.0f} rows/s', err=True)
+
+    # no after_import : the web workers' caches and indexes are not in this process,
+    # they catch up within RESPONSE_CACHE_TTL and AUTOCOMPLETE_MAX_AGE
+    report = import_rows(entity, file, format, batch_size=batch_size,
+                         max_errors=app.config['IMPORT_MAX_ERRORS'], progress=progress)
+
+    for error in report.sorted_errors():
+        messages = '; '.join(f'{name}: {" ".join(errors)}' for name, errors in error['errors'].items())
+        click.echo(f'line {error["line"]}: {messages}')
+    if report.error_count > len(report.errors):
+        click.echo(f'... {report.error_count - len(report.errors)} more errors')
+    click.echo(f'{report.inserted} of {report.rows} {entity} imported in {report.seconds:.2f}s '
+               f'({report.rows_per_second:.0f} rows/s).')
+
+
+@app.cli.command('export')
+@click.argument('entity', type=click.Choice(list(EXPORTS)))
+@click.option('--format', type=click.Choice(list(EXPORT_FORMATS)), default='csv', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Defaults to stdout.')
+@click.option('--batch-size', type=int, default=lambda: app.config['EXPORT_BATCH_SIZE'],
+              show_default='EXPORT_BATCH_SIZE')
+def export_command(entity, format, compress, output, batch_size):
+    """Export venues, artists, shows, albums or songs as CSV, NDJSON or columnar row groups."""
+    started = time.perf_counter()
+    size = 0
+    for chunk in export_chunks(entity, format, batch_size, compress=compress):
+        output.write(chunk)
+        size += len(chunk)
+    click.echo(f'{entity} exported, {size} bytes in {time.perf_counter() - started:.2f}s.', err=True)
 
 
 if not app.debug:
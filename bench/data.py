@@ -0,0 +1,204 @@
+# ----------------------------------------------------------------------------#
+# Synthetic data : fills the benchmark database with venues, artists, shows,
+# albums and songs, the same rows for the same scale and seed.
+#
+# usage : python -m bench.data [--scale 1k|100k|1m] [--seed 42] [--database URL]
+#
+# The target is BENCH_DATABASE_URI (FYYUR_BENCH_DATABASE_URL) unless given,
+# and is emptied first. The schema is migrated to head, rows are loaded with
+# COPY with the user triggers off, and the counters are rebuilt afterwards.
+# ----------------------------------------------------------------------------#
+
+import argparse
+import io
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask_migrate import upgrade
+
+from app import app
+from forms import ArtistForm, VenueForm
+from models import db
+from models.counters import rebuild_counters
+
+# shows per scale; every other table is sized from it
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+
+TABLES = ['venues', 'artists', 'shows', 'albums', 'songs']
+COLUMNS = {
+    'venues': ('id', 'name', 'city', 'state', 'address', 'phone', 'image_link', 'facebook_link',
+               'genres', 'website_link', 'seeking_talent', 'seeking_description'),
+    'artists': ('id', 'name', 'city', 'state', 'phone', 'genres', 'image_link', 'facebook_link',
+                'website_link', 'seeking_venue', 'seeking_description'),
+    'shows': ('id', 'venue_id', 'artist_id', 'start_time', 'end_time'),
+    'albums': ('id', 'artist_id', 'name', 'release_date', 'image_link'),
+    'songs': ('id', 'album_id', 'name', 'duration', 'position'),
+}
+
+# rows per COPY round trip
+CHUNK_SIZE = 50000
+
+WORDS = ('Blue', 'Velvet', 'Electric', 'Golden', 'Midnight', 'Silver', 'Wild', 'Lonely', 'Neon', 'Broken',
+         'Crimson', 'Paper', 'Static', 'Hollow', 'Northern', 'Echo', 'Stone', 'Glass', 'Fire', 'River')
+VENUE_KINDS = ('Hall', 'Club', 'Lounge', 'Theatre', 'Room', 'Bar', 'Arena', 'Cellar')
+ARTIST_KINDS = ('Band', 'Quartet', 'Collective', 'Orchestra', 'Trio', 'Project', 'Brothers', 'Sisters')
+CITIES = ('San Francisco', 'New York', 'Austin', 'Seattle', 'Chicago', 'Nashville', 'Portland', 'Denver',
+          'Boston', 'Atlanta', 'Detroit', 'New Orleans', 'Los Angeles', 'Miami', 'Minneapolis', 'Phoenix')
+
+STATES = [value for value, _ in VenueForm.state.kwargs['choices']]
+GENRES = [value for value, _ in ArtistForm.genres.kwargs['choices']]
+
+
+def sizes(shows):
+    # a venue hosts about 50 shows and an artist plays about 20; 2 albums of 10 songs per artist
+    venues = max(shows // 50, 10)
+    artists = max(shows // 20, 20)
+    return {'venues': venues, 'artists': artists, 'shows': shows,
+            'albums': artists * 2, 'songs': artists * 20}
+
+
+def name(rnd, kinds):
+    return f'{rnd.choice(WORDS)} {rnd.choice(WORDS)} {rnd.choice(kinds)}'
+
+
+def genres(rnd):
+    return '{%s}' % ','.join('"%s"' % genre for genre in rnd.sample(GENRES, rnd.randint(1, 3)))
+
+
+def venue_rows(rnd, count):
+    for id in range(1, count + 1):
+        yield (id, f'The {name(rnd, VENUE_KINDS)}', rnd.choice(CITIES), rnd.choice(STATES),
+               f'{rnd.randint(1, 9999)} {rnd.choice(WORDS)} Street', '326-123-5000',
+               f'https://images.example.com/venues/{id}.jpg', f'https://www.facebook.com/venue{id}',
+               genres(rnd), f'https://venue{id}.example.com', rnd.random() < 0.5, 'Looking for local acts')
+
+
+def artist_rows(rnd, count):
+    for id in range(1, count + 1):
+        yield (id, name(rnd, ARTIST_KINDS), rnd.choice(CITIES), rnd.choice(STATES), '326-123-5000',
+               genres(rnd), f'https://images.example.com/artists/{id}.jpg',
+               f'https://www.facebook.com/artist{id}', f'https://artist{id}.example.com',
+               rnd.random() < 0.5, 'Looking for shows to perform at')
+
+
+def show_rows(rnd, count, venues, artists, anchor):
+    # one slot of shows at every venue after the other, spread over two years around the anchor;
+    # within a slot the venues are all different and so are the artists (artists >= venues),
+    # and a show ends at least 50 minutes before the next slot : no double booking
+    slots = -(-count // venues)
+    spacing = max(timedelta(days=730) / slots, timedelta(hours=4))
+    first = anchor - spacing * (slots // 2)
+    stride = 7919
+    for id in range(1, count + 1):
+        slot, venue = divmod(id - 1, venues)
+        start = first + spacing * slot + timedelta(minutes=rnd.randrange(0, 60, 15))
+        end = start + timedelta(minutes=rnd.choice((90, 120, 150, 180)))
+        yield id, venue + 1, (venue + slot * stride) % artists + 1, start, end
+
+
+def album_rows(rnd, count, artists, anchor):
+    for id in range(1, count + 1):
+        yield (id, (id - 1) % artists + 1, f'{rnd.choice(WORDS)} {rnd.choice(WORDS)}',
+               anchor - timedelta(days=rnd.randint(0, 3650)), f'https://images.example.com/albums/{id}.jpg')
+
+
+def song_rows(rnd, count, albums):
+    per_album = count // albums
+    for id in range(1, count + 1):
+        album, position = divmod(id - 1, per_album)
+        yield id, album + 1, f'{rnd.choice(WORDS)} {rnd.choice(WORDS)}', rnd.randint(90, 420), position + 1
+
+
+def copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def copy_rows(cursor, table, rows):
+    # COPY in chunks, the rows are generated lazily
+    statement = 'COPY {} ({}) FROM STDIN'.format(table, ', '.join(COLUMNS[table]))
+    count = 0
+    while True:
+        buffer = io.StringIO()
+        written = 0
+        for row in rows:
+            buffer.write('\t'.join(copy_value(value) for value in row) + '\n')
+            written += 1
+            if written == CHUNK_SIZE:
+                break
+        if not written:
+            return count
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+        count += written
+
+
+def generate(shows, seed=42, anchor=None):
+    """Empty the benchmark tables and fill them for ``shows`` shows.
+
+    The anchor (today at midnight by default) splits the shows between past
+    and upcoming; returns the row count of every table.
+    """
+    rnd = random.Random(seed)
+    anchor = anchor or datetime.combine(datetime.now().date(), datetime.min.time())
+    counts = sizes(shows)
+    rows = {
+        'venues': venue_rows(rnd, counts['venues']),
+        'artists': artist_rows(rnd, counts['artists']),
+        'shows': show_rows(rnd, counts['shows'], counts['venues'], counts['artists'], anchor),
+        'albums': album_rows(rnd, counts['albums'], counts['artists'], anchor),
+        'songs': song_rows(rnd, counts['songs'], counts['albums']),
+    }
+
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('TRUNCATE {} RESTART IDENTITY CASCADE'.format(', '.join(TABLES)))
+        for table in TABLES:
+            start = time.perf_counter()
+            cursor.execute(f'ALTER TABLE {table} DISABLE TRIGGER USER')
+            copy_rows(cursor, table, rows[table])
+            cursor.execute(f'ALTER TABLE {table} ENABLE TRIGGER USER')
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), {counts[table]})")
+            print('%-8s %9d rows %8.2fs' % (table, counts[table], time.perf_counter() - start))
+        connection.commit()
+    finally:
+        connection.close()
+
+    rebuild_counters()
+    db.session.execute('ANALYZE')
+    db.session.commit()
+    return counts
+
+
+def use_database(uri):
+    # point the app at the benchmark database, before anything connected
+    if uri == app.config['SQLALCHEMY_DATABASE_URI']:
+        raise ValueError('Refusing to fill the application database, pass a benchmark database')
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+
+
+def main(scale, seed, database):
+    use_database(database)
+    with app.app_context():
+        upgrade(directory='migrations')
+        start = time.perf_counter()
+        generate(SCALES[scale], seed)
+        print('%-8s %24.2fs' % ('total', time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill the benchmark database with synthetic data.')
+    parser.add_argument('--scale', choices=SCALES, default='1k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', default=app.config['BENCH_DATABASE_URI'])
+    args = parser.parse_args()
+    try:
+        main(args.scale, args.seed, args.database)
+    except ValueError as e:
+        sys.exit(str(e))
@@ -0,0 +1,86 @@
+# ----------------------------------------------------------------------------#
+# Index check : EXPLAIN the hot show/album/song queries and make sure the
+# planner can answer each of them from its index.
+#
+# usage : python -m bench.explain
+#
+# Sequential scans are disabled for the check, so that a small development
+# database reports whether an index is usable rather than whether it is worth
+# it at the current table size. A check passes when the plan has an Index
+# Scan, Index Only Scan or Bitmap Index Scan on its index and no Seq Scan;
+# exits with status 1 otherwise.
+# ----------------------------------------------------------------------------#
+
+import sys
+from datetime import datetime
+
+from app import app
+from models import db
+
+CHECKS = [
+    ('ix_shows_venue_id_start_time',
+     'SELECT * FROM shows WHERE venue_id = :id AND start_time > :now'),
+    ('ix_shows_artist_id_start_time',
+     'SELECT * FROM shows WHERE artist_id = :id AND start_time < :now'),
+    ('ix_shows_start_time_id',
+     'SELECT * FROM shows WHERE (start_time, id) > (:now, :id) ORDER BY start_time, id LIMIT 30'),
+    ('ix_albums_artist_id',
+     'SELECT * FROM albums WHERE artist_id = :id'),
+    # the tracklist index leads with album_id as well
+    (('ix_songs_album_id', 'ix_songs_album_id_position'),
+     'SELECT * FROM songs WHERE album_id = :id'),
+    ('ix_venues_genres',
+     "SELECT * FROM venues WHERE genres @> ARRAY['Jazz']::varchar[]"),
+    ('ix_artists_genres',
+     "SELECT * FROM artists WHERE genres @> ARRAY['Jazz']::varchar[]"),
+    ('ix_venues_name_trgm',
+     "SELECT * FROM venues WHERE name ILIKE '%jazz%'"),
+    ('ix_artists_name_trgm',
+     "SELECT * FROM artists WHERE name ILIKE '%jazz%'"),
+    # search ranking, nearest first off the index even for a term too short to filter on
+    ('ix_venues_name_trgm_gist',
+     "SELECT id FROM venues WHERE name ILIKE '%a%' ORDER BY name <-> 'a' LIMIT 50"),
+    ('ix_artists_name_trgm_gist',
+     "SELECT id FROM artists WHERE name ILIKE '%a%' ORDER BY name <-> 'a' LIMIT 50"),
+]
+
+
+INDEX_SCANS = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+
+def explain(statement, **params):
+    # the plan tree, as EXPLAIN (FORMAT JSON) gives it
+    return db.session.execute('EXPLAIN (FORMAT JSON) ' + statement, params).scalar()[0]['Plan']
+
+
+def scans(node):
+    # (node type, index name) of every node of the plan
+    yield node['Node Type'], node.get('Index Name')
+    for child in node.get('Plans', ()):
+        yield from scans(child)
+
+
+def uses_index(plan, indexes):
+    nodes = list(scans(plan))
+    return (any(kind in INDEX_SCANS and name in indexes for kind, name in nodes)
+            and not any(kind == 'Seq Scan' for kind, _ in nodes))
+
+
+def main():
+    failures = 0
+    with app.app_context():
+        db.session.execute('SET LOCAL enable_seqscan = off')
+        for index, statement in CHECKS:
+            plan = explain(statement, id=1, now=datetime.now())
+            indexes = index if isinstance(index, tuple) else (index,)
+            used = uses_index(plan, indexes)
+            failures += not used
+            print('%-32s %s' % (indexes[0], 'ok' if used else 'NOT USED'))
+            if not used:
+                print('\n'.join('  %s %s' % (kind, name or '') for kind, name in scans(plan)))
+        db.session.rollback()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
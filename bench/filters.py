@@ -0,0 +1,62 @@
+# ----------------------------------------------------------------------------#
+# Benchmark : cost per call of the `datetime` template filter.
+#
+# Compares the previous implementation (pattern parsed by babel on every call)
+# with the precompiled patterns, cold and with the value cache warm.
+#
+# usage : python -m bench.filters [--calls 20000] [--locale en]
+# ----------------------------------------------------------------------------#
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import babel.dates
+import dateutil.parser
+
+from utils import DATETIME_FORMATS, cached_format_datetime
+
+
+def legacy_format_datetime(value, format='medium', locale='en'):
+    # previous implementation of utils.format_datetime, kept for comparison
+    if not isinstance(value, datetime):
+        date = dateutil.parser.parse(value)
+    else:
+        date = value
+    return babel.dates.format_datetime(date, DATETIME_FORMATS.get(format, format), locale=locale)
+
+
+def sample_values(calls, seed=42):
+    # distinct show times over a couple of years, as on a long /shows listing
+    rnd = random.Random(seed)
+    start = datetime(2020, 1, 1, 20)
+    return [start + timedelta(days=rnd.randint(0, 730), minutes=30 * rnd.randint(0, 8)) for _ in range(calls)]
+
+
+def per_call(fn, values, format, locale):
+    start = time.perf_counter()
+    for value in values:
+        fn(value, format, locale)
+    return (time.perf_counter() - start) / len(values)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the datetime template filter.')
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--locale', default='en')
+    args = parser.parse_args()
+
+    print('%8s %8s %14s %14s %14s' % ('format', 'input', 'legacy (us)', 'cold (us)', 'warm (us)'))
+    for format in DATETIME_FORMATS:
+        for kind, values in [('datetime', sample_values(args.calls)),
+                             ('string', [value.isoformat() for value in sample_values(args.calls)])]:
+            for value in values[:100]:
+                assert cached_format_datetime(value, format, args.locale) == \
+                    legacy_format_datetime(value, format, args.locale)
+            cached_format_datetime.cache_clear()
+            legacy = per_call(legacy_format_datetime, values, format, args.locale)
+            cached_format_datetime.cache_clear()
+            cold = per_call(cached_format_datetime.__wrapped__, values, format, args.locale)
+            warm = per_call(cached_format_datetime, values[:1000] * (args.calls // 1000 or 1), format, args.locale)
+            print('%8s %8s %14.2f %14.2f %14.2f' % (format, kind, legacy * 1e6, cold * 1e6, warm * 1e6))
@@ -0,0 +1,95 @@
+# ----------------------------------------------------------------------------#
+# Benchmark : relationship loading profiles vs the former lazy='joined'
+# relationships, per route.
+#
+# usage : python -m bench.loading [--repeat 20]
+#
+# The response cache is off, every request renders its page.
+# ----------------------------------------------------------------------------#
+
+import argparse
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import models
+from app import app, response_cache
+from models import db, Album, Artist, Venue
+
+# the eager loads every query used to get from the lazy='joined' declarations
+JOINED_PROFILE = {
+    Venue: lambda: (db.joinedload(Venue.shows),),
+    Artist: lambda: (db.joinedload(Artist.albums).joinedload(Album.songs),),
+    Album: lambda: (db.joinedload(Album.songs),),
+}
+
+
+@contextmanager
+def joined_loading():
+    profiles = models.LOADING_PROFILES
+    models.LOADING_PROFILES = {
+        model: {name: JOINED_PROFILE[model] for name in names}
+        for model, names in profiles.items()
+    }
+    try:
+        yield
+    finally:
+        models.LOADING_PROFILES = profiles
+
+
+def routes():
+    with app.app_context():
+        venue = Venue.query.with_entities(Venue.id).first()
+        artist = Artist.query.with_entities(Artist.id).first()
+        album = Album.query.with_entities(Album.id).first()
+    paths = ['/']
+    if venue:
+        paths += ['/venues/%d' % venue.id, '/venues/%d/edit' % venue.id]
+    if artist:
+        paths += ['/artists/%d' % artist.id, '/artists/%d/edit' % artist.id]
+    if album:
+        paths += ['/albums/%d' % album.id, '/albums/%d/edit' % album.id]
+    return paths
+
+
+def measure(client, path, repeat):
+    stats = {'queries': 0, 'rows': 0}
+    thread = threading.get_ident()
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        # the request's own, not the background autocomplete build's
+        if threading.get_ident() == thread:
+            stats['queries'] += 1
+            stats['rows'] += max(cursor.rowcount, 0)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'after_cursor_execute', count)
+    try:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            client.get(path)
+        elapsed = (time.perf_counter() - start) / repeat
+    finally:
+        event.remove(engine, 'after_cursor_execute', count)
+    return stats['queries'] // repeat, stats['rows'] // repeat, elapsed * 1000
+
+
+def main(repeat):
+    response_cache.backend = None
+    client = app.test_client()
+    print('%-20s %22s %22s' % ('', 'joined', 'profiles'))
+    print('%-20s %7s %6s %7s %7s %6s %7s' % ('route', 'queries', 'rows', 'ms', 'queries', 'rows', 'ms'))
+    for path in routes():
+        with joined_loading():
+            before = measure(client, path, repeat)
+        after = measure(client, path, repeat)
+        print('%-20s %7d %6d %7.2f %7d %6d %7.2f' % ((path,) + before + after))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark relationship loading per route.')
+    parser.add_argument('--repeat', type=int, default=20)
+    main(parser.parse_args().repeat)
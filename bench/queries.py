@@ -0,0 +1,89 @@
+# ----------------------------------------------------------------------------#
+# Query count check : the search routes answer with a fixed number of SQL
+# statements, however many rows match (no query per result row).
+#
+# usage : python -m bench.queries [--database postgresql://...]
+#
+# Runs against BENCH_DATABASE_URI, filled by bench.data or bench.suite --scale.
+# Exits with status 1 when a route runs another number of statements, or when
+# a search matches fewer than two rows, which could not tell one query per
+# row from one query in all.
+# ----------------------------------------------------------------------------#
+
+import argparse
+import sys
+import threading
+
+from sqlalchemy import event
+
+from app import app
+from bench.data import use_database
+from models import db, Artist, Venue
+from search import search_catalog
+
+# (endpoint url, model searched, search term template, statements expected); the
+# terms take the most common city and state of the model, to match many rows
+CHECKS = [
+    ('/artists/search', Artist, '{name}', 1),
+    ('/artists/search', Artist, 'city:"{city}"', 1),
+    ('/artists/search', Artist, '{city}, {state}', 1),
+    ('/venues/search', Venue, '{name}', 1),
+    ('/venues/search', Venue, 'city:"{city}"', 1),
+    ('/venues/search', Venue, '{city}, {state}', 1),
+]
+
+
+def search_term(model, template):
+    city, state = model.query.with_entities(model.city, model.state).group_by(model.city, model.state) \
+        .order_by(db.func.count().desc()).first() or ('', '')
+    return template.format(name='a', city=city, state=state)
+
+
+def statements(client, url, term):
+    executed = []
+    thread = threading.get_ident()
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        # the request's own, not the background autocomplete build's
+        if threading.get_ident() == thread:
+            executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'after_cursor_execute', count)
+    try:
+        response = client.post(url, data={'search_term': term})
+    finally:
+        event.remove(engine, 'after_cursor_execute', count)
+    if response.status_code != 200:
+        raise RuntimeError(f'POST {url} answered {response.status}')
+    return executed
+
+
+def main(database):
+    use_database(database)
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    failures = 0
+    for url, model, template, expected in CHECKS:
+        with app.app_context():
+            term = search_term(model, template)
+            matches, _ = search_catalog(model, term, app.config['SEARCH_RESULTS_LIMIT'],
+                                        app.config['SEARCH_COUNT_LIMIT'])
+            db.session.remove()
+        executed = statements(client, url, term)
+        ok = len(executed) == expected and matches >= 2
+        failures += not ok
+        print('%-16s %-26s %5d matches %3d statements  %s' % (
+            url, term, matches, len(executed), 'ok' if ok else 'FAILED'))
+        if matches < 2:
+            print('  fewer than 2 matches, fill the benchmark database (python -m bench.data)')
+        elif len(executed) != expected:
+            print('  expected %d statements :\n  %s' % (expected, '\n  '.join(executed)))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the number of statements of the search routes.')
+    parser.add_argument('--database', default=app.config['BENCH_DATABASE_URI'])
+    sys.exit(main(parser.parse_args().database))
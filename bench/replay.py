@@ -0,0 +1,158 @@
+# ----------------------------------------------------------------------------#
+# Traffic replay : re-issues captured requests (see telemetry.traffic) against
+# a running instance and reports throughput and latency per endpoint.
+#
+# usage : python -m bench.replay [traffic/requests.jsonl] [--url http://localhost:5000]
+#                                [--concurrency 8] [--speed 1] [--methods GET,POST] [--output report.json]
+#
+# Requests leave at their captured pace divided by --speed (2 replays an hour
+# of traffic in 30 minutes, 0 sends them as fast as the workers allow), on
+# --concurrency connections. Redirects are not followed, as they were separate
+# requests when captured. Writes are replayed too, point it at a disposable
+# instance with CSRF off (WTF_CSRF_ENABLED = False), or keep to --methods GET.
+# Requests captured without their body, and those needing the admin token,
+# come back as errors.
+# ----------------------------------------------------------------------------#
+
+import argparse
+import json
+import math
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+opener = urllib.request.build_opener(NoRedirect)
+
+
+def captured(path, methods):
+    # read up front, the target may be capturing into the same file
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    # lines are written as requests end, replay them in the order they came in
+    return sorted((record for record in records if record['method'] in methods), key=lambda record: record['time'])
+
+
+def build_request(base_url, record):
+    data, headers = None, {}
+    if 'json' in record:
+        data, headers = json.dumps(record['json']).encode(), {'Content-Type': 'application/json'}
+    elif 'form' in record:
+        data = urllib.parse.urlencode(record['form'], doseq=True).encode()
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    return urllib.request.Request(base_url + record['path'], data=data, headers=headers, method=record['method'])
+
+
+def send(base_url, record, timeout, due):
+    req = build_request(base_url, record)
+    start = time.perf_counter()
+    # how late the request left, waiting for a free connection
+    lag = max(start - due, 0) if due is not None else 0
+    try:
+        with opener.open(req, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = None
+    return record, status, time.perf_counter() - start, lag
+
+
+def percentile(ordered, fraction):
+    # nearest rank
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def replay(records, base_url, concurrency, speed, timeout):
+    results = []
+    lock = threading.Lock()
+
+    def done(future):
+        with lock:
+            results.append(future.result())
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        first = due = None
+        for record in records:
+            if speed:
+                first = first if first is not None else record['time']
+                due = started + (record['time'] - first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(send, base_url, record, timeout, due).add_done_callback(done)
+    return results, time.perf_counter() - started
+
+
+def report(results, elapsed):
+    endpoints = defaultdict(list)
+    for record, status, seconds, _ in results:
+        endpoints[record.get('endpoint') or 'unmatched'].append((record, status, seconds))
+
+    summary = {'requests': len(results), 'seconds': elapsed, 'throughput': len(results) / elapsed,
+               'max_lag_ms': max(lag for _, _, _, lag in results) * 1000, 'endpoints': {}}
+    for endpoint, rows in endpoints.items():
+        timings = sorted(seconds * 1000 for _, _, seconds in rows)
+        captured = sorted(record['duration_ms'] for record, _, _ in rows if 'duration_ms' in record)
+        summary['endpoints'][endpoint] = {
+            'requests': len(rows),
+            'errors': sum(1 for _, status, _ in rows if status is None or status >= 400),
+            'throughput': len(rows) / elapsed,
+            'p50_ms': percentile(timings, 0.5),
+            'p90_ms': percentile(timings, 0.9),
+            'p99_ms': percentile(timings, 0.99),
+            'max_ms': timings[-1],
+            'captured_p90_ms': percentile(captured, 0.9) if captured else None,
+        }
+    return summary
+
+
+def print_report(summary):
+    print('%-28s %8s %7s %8s %9s %9s %9s %9s %12s' % (
+        'endpoint', 'requests', 'errors', 'req/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'captured p90'))
+    for endpoint, row in sorted(summary['endpoints'].items(), key=lambda item: -item[1]['requests']):
+        print('%-28s %8d %7d %8.1f %9.2f %9.2f %9.2f %9.2f %12s' % (
+            endpoint, row['requests'], row['errors'], row['throughput'], row['p50_ms'], row['p90_ms'],
+            row['p99_ms'], row['max_ms'],
+            '-' if row['captured_p90_ms'] is None else '%.2f' % row['captured_p90_ms']))
+    print('%d requests in %.1fs, %.1f req/s, sent up to %.0fms behind the captured pace' % (
+        summary['requests'], summary['seconds'], summary['throughput'], summary['max_lag_ms']))
+
+
+def main(args):
+    methods = {method.strip().upper() for method in args.methods.split(',')}
+    records = captured(args.traffic, methods)
+    results, elapsed = replay(records, args.url.rstrip('/'), args.concurrency, args.speed, args.timeout)
+    if not results:
+        sys.exit('No requests to replay')
+    summary = report(results, elapsed)
+    print_report(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay captured traffic against a running instance.')
+    parser.add_argument('traffic', nargs='?', default='traffic/requests.jsonl')
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--speed', type=float, default=1.0, help='speed-up factor, 0 for no pauses')
+    parser.add_argument('--methods', default='GET,POST,DELETE')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--output', help='write the report as json')
+    main(parser.parse_args())
@@ -0,0 +1,88 @@
+# ----------------------------------------------------------------------------#
+# Benchmark : search latency as the catalog grows.
+#
+# usage : python -m bench.search [--scales 1k 100k] [--repeat 50] [--max-growth 2]
+#                                [--min-ms 2] [--database postgresql://...]
+#
+# Fills BENCH_DATABASE_URI at every scale in turn (see bench.data), then times
+# the venue and artist search routes for a term too short for the trigram
+# index, common words, a city and state, and a term matching nothing. Exits
+# with status 1 when the p99 of a search at the largest scale is more than
+# --max-growth times its p99 at the smallest one, and by more than --min-ms.
+# ----------------------------------------------------------------------------#
+
+import argparse
+import math
+import sys
+import time
+
+from flask_migrate import upgrade
+
+from app import app
+from bench.data import SCALES, generate, use_database
+
+SEARCHES = [
+    ('/venues/search', 'a'),
+    ('/venues/search', 'Blue'),
+    ('/venues/search', 'San Francisco, CA'),
+    ('/venues/search', 'zzzz'),
+    ('/artists/search', 'a'),
+    ('/artists/search', 'Velvet Band'),
+    ('/artists/search', 'city:"New York"'),
+    ('/artists/search', 'zzzz'),
+]
+
+
+def percentile(ordered, fraction):
+    # nearest rank
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def measure(client, url, term, repeat, warmup=3):
+    timings = []
+    for i in range(warmup + repeat):
+        start = time.perf_counter()
+        response = client.post(url, data={'search_term': term})
+        response.get_data()
+        timings.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f'POST {url} {term!r} answered {response.status}')
+    timings = sorted(timings[warmup:])
+    return percentile(timings, 0.5) * 1000, percentile(timings, 0.99) * 1000
+
+
+def main(args):
+    use_database(args.database)
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+
+    results = {}
+    for scale in args.scales:
+        with app.app_context():
+            upgrade(directory='migrations')
+            generate(SCALES[scale], args.seed)
+        for url, term in SEARCHES:
+            results[(url, term, scale)] = measure(client, url, term, args.repeat)
+
+    first, last = args.scales[0], args.scales[-1]
+    print('%-16s %-20s' % ('route', 'term') + ''.join('%18s' % f'{scale} p50/p99 ms' for scale in args.scales))
+    failures = 0
+    for url, term in SEARCHES:
+        before, after = results[(url, term, first)][1], results[(url, term, last)][1]
+        grew = after > before * args.max_growth and after - before > args.min_ms
+        failures += grew
+        print('%-16s %-20s' % (url, term) + ''.join(
+            '%18s' % ('%.2f / %.2f' % results[(url, term, scale)]) for scale in args.scales)
+            + ('  GREW %.1fx' % (after / before) if grew else ''))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark search latency across catalog sizes.')
+    parser.add_argument('--scales', nargs='+', choices=SCALES, default=['1k', '100k'])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', default=app.config['BENCH_DATABASE_URI'])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--max-growth', type=float, default=2.0, help='allowed p99 growth factor')
+    parser.add_argument('--min-ms', type=float, default=2.0, help='growth below this is noise')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,351 @@
+# ----------------------------------------------------------------------------#
+# Benchmark suite : drives every route of the app through the test client and
+# compares latency and query counts with a stored baseline.
+#
+# usage : python -m bench.suite [--scale 1k|100k|1m] [--repeat 20] [--output bench/results.json]
+#                               [--baseline bench/baseline.json] [--threshold 0.25] [--update-baseline]
+#                               [--cache]
+#
+# Runs against BENCH_DATABASE_URI; --scale refills it first (see bench.data),
+# which a comparison needs since the write routes add rows. Reads come first,
+# then writes, each route warmed up before it is timed. Exits with status 1
+# when a route got slower than the baseline by more than the threshold, runs
+# more queries than it did, or when a route of the app is not driven here.
+# The first run, or --update-baseline, stores the baseline instead.
+#
+# The response cache is off, so every request renders its page; --cache times
+# cached pages as the hits they become after warm up instead. The baseline
+# records the mode and only compares with a run in the same one.
+# ----------------------------------------------------------------------------#
+
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask_migrate import upgrade
+from sqlalchemy import event
+
+from app import app, response_cache
+from bench.data import SCALES, TABLES, generate, use_database
+from models import db, Album, Artist, Song, Venue
+from models.tracklist import insert_songs
+
+ADMIN_TOKEN = 'bench'
+
+# ``build(i)`` returns the url and test client arguments of the i-th request, and
+# sets up anything it needs outside of the timing; the endpoint comes from the url map
+Route = namedtuple('Route', 'method build')
+
+
+def get(url, **kwargs):
+    return lambda i: (url, kwargs)
+
+
+def venue_form(name):
+    return {'name': name, 'city': 'San Francisco', 'state': 'CA', 'address': '1015 Folsom Street',
+            'phone': '123-123-1234', 'genres': ['Jazz', 'Blues'], 'image_link': 'https://example.com/venue.jpg',
+            'facebook_link': 'https://www.facebook.com/bench', 'website_link': 'https://example.com',
+            'seeking_talent': 'y', 'seeking_description': 'Benchmark'}
+
+
+def artist_form(name):
+    data = venue_form(name)
+    del data['address'], data['seeking_talent']
+    return dict(data, seeking_venue='y')
+
+
+def fixtures():
+    # the busiest venue and artist and the longest album, the worst case of their pages
+    return {
+        'venue': Venue.query.with_entities(Venue.id).order_by(Venue.upcoming_show_count.desc()).first().id,
+        'artist': Artist.query.with_entities(Artist.id).order_by(Artist.upcoming_show_count.desc()).first().id,
+        'album': Album.query.with_entities(Album.id).order_by(Album.track_count.desc()).first().id,
+        'search': Venue.query.with_entities(Venue.name).first().name.split()[1],
+    }
+
+
+def created(model, **values):
+    # a row for a write route to work on, committed outside of the timing
+    row = model(**values)
+    db.session.add(row)
+    db.session.commit()
+    id = row.id
+    db.session.close()
+    return id
+
+
+def routes(ids):
+    venue, artist, album = ids['venue'], ids['artist'], ids['album']
+    admin = {'headers': {'Authorization': f'Bearer {ADMIN_TOKEN}'}}
+    # far enough ahead not to meet the generated shows, a day apart not to meet each other
+    show_slots = itertools.count()
+    first_slot = datetime.now() + timedelta(days=5 * 365)
+
+    def new_venue(i):
+        return f'/venues/{created(Venue, **dict(venue_form("Bench venue"), seeking_talent=True))}', {}
+
+    def new_artist(i):
+        return f'/artists/{created(Artist, **dict(artist_form("Bench artist"), seeking_venue=True))}/delete', {}
+
+    def new_album(i):
+        return f'/albums/{created(Album, artist_id=artist, name="Bench", release_date=datetime.now())}/delete', {}
+
+    def new_song(i):
+        # appended, the delete then has no track to move up
+        song, = insert_songs(album, [Song(name='Bench', duration=180)])
+        db.session.commit()
+        song_id = song.id
+        db.session.close()
+        return f'/albums/{album}/songs/{song_id}/delete', {}
+
+    def new_show(i):
+        start = first_slot + timedelta(days=next(show_slots))
+        return '/shows/create', {'data': {'artist_id': artist, 'venue_id': venue,
+                                          'start_time': start.strftime('%Y-%m-%d %H:%M:%S')}}
+
+    def reorder(i):
+        song_ids = [id for id, in Song.query.with_entities(Song.id).filter_by(album_id=album).order_by(Song.position)]
+        db.session.close()
+        return f'/albums/{album}/songs/reorder', {'json': {'song_ids': song_ids[::-1]}}
+
+    def import_venues(i):
+        lines = '\n'.join(json.dumps(dict(venue_form(f'Imported venue {n}'), seeking_talent=True))
+                          for n in range(10))
+        return '/import/venues?format=ndjson', dict(admin, data=lines, content_type='application/x-ndjson')
+
+    return [
+        # reads
+        Route('GET', get('/')),
+        Route('GET', get('/venues')),
+        Route('POST', get('/venues/search', data={'search_term': ids['search']})),
+        Route('GET', get(f'/venues/{venue}')),
+        Route('GET', get(f'/venues/{venue}/calendar.ics')),
+        Route('GET', get('/venues/create')),
+        Route('GET', get(f'/venues/{venue}/edit')),
+        Route('GET', get('/artists')),
+        Route('POST', get('/artists/search', data={'search_term': ids['search']})),
+        Route('GET', get(f'/artists/{artist}')),
+        Route('GET', get(f'/artists/{artist}/calendar.ics')),
+        Route('GET', get('/artists/create')),
+        Route('GET', get(f'/artists/{artist}/edit')),
+        Route('GET', get(f'/artists/{artist}/albums/create')),
+        Route('GET', get(f'/albums/{album}')),
+        Route('GET', get(f'/albums/{album}/edit')),
+        Route('GET', get(f'/albums/{album}/songs/create')),
+        Route('GET', get('/shows')),
+        Route('GET', get('/shows.json')),
+        Route('GET', get('/shows/create')),
+        Route('GET', get('/autocomplete?q=' + ids['search'][:3])),
+        Route('GET', get('/api/v1/shows?limit=100')),
+        Route('GET', get(f'/api/v1/venues/{venue}')),
+        Route('GET', get('/export/venues?format=csv', **admin)),
+        Route('GET', get('/cache/stats')),
+        Route('GET', get('/metrics')),
+        # writes
+        Route('POST', get('/venues/create', data=venue_form('Bench venue'))),
+        Route('POST', get(f'/venues/{venue}/edit', data=venue_form('Bench venue'))),
+        Route('DELETE', new_venue),
+        Route('POST', get('/artists/create', data=artist_form('Bench artist'))),
+        Route('POST', get(f'/artists/{artist}/edit', data=artist_form('Bench artist'))),
+        Route('DELETE', new_artist),
+        Route('POST', new_show),
+        Route('POST', get(f'/artists/{artist}/albums/create',
+                          data={'name': 'Bench', 'release_date': '2020-01-01 00:00:00',
+                                'image_link': 'https://example.com/album.jpg'})),
+        Route('POST', get(f'/albums/{album}/edit',
+                          data={'name': 'Bench', 'release_date': '2020-01-01 00:00:00',
+                                'image_link': 'https://example.com/album.jpg'})),
+        Route('DELETE', new_album),
+        Route('POST', get(f'/albums/{album}/songs/create', data={'name': 'Bench', 'duration': '180'})),
+        Route('DELETE', new_song),
+        Route('POST', reorder),
+        Route('POST', import_venues),
+    ]
+
+
+def percentile(ordered, fraction):
+    # nearest rank
+    return ordered[max(math.ceil(fraction * len(ordered)) - 1, 0)]
+
+
+def peak_rss():
+    # kilobytes on linux, bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def measure(route, repeat, warmup):
+    # a client per route, the flash messages of the write routes pile up in its session
+    client = app.test_client()
+    queries = []
+    thread = threading.get_ident()
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        # the request's own, not the background autocomplete build's
+        if threading.get_ident() == thread:
+            queries[-1] += 1
+
+    with app.app_context():
+        engine = db.engine
+    adapter = app.url_map.bind('localhost')
+    timings = []
+    event.listen(engine, 'after_cursor_execute', count)
+    try:
+        for i in range(warmup + repeat):
+            queries.append(0)
+            with app.app_context():
+                url, kwargs = route.build(i)
+            queries[-1] = 0
+            start = time.perf_counter()
+            response = client.open(url, method=route.method, **kwargs)
+            response.get_data()
+            timings.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{route.method} {url} answered {response.status}')
+    finally:
+        event.remove(engine, 'after_cursor_execute', count)
+
+    endpoint, _ = adapter.match(url.split('?')[0], method=route.method)
+    timings = sorted(timings[warmup:])
+    ordered_queries = sorted(queries[warmup:])
+    return {
+        'endpoint': endpoint,
+        'method': route.method,
+        'url': url,
+        'status': response.status_code,
+        'p50_ms': percentile(timings, 0.5) * 1000,
+        'p90_ms': percentile(timings, 0.9) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'max_ms': timings[-1] * 1000,
+        'mean_ms': sum(timings) / len(timings) * 1000,
+        'queries': percentile(ordered_queries, 0.5),
+        'peak_rss_kb': peak_rss(),
+    }
+
+
+def table_counts():
+    return {table: db.session.execute(f'SELECT count(*) FROM {table}').scalar() for table in TABLES}
+
+
+def run(repeat, warmup):
+    with app.app_context():
+        counts = table_counts()
+        ids = fixtures()
+        db.session.close()
+
+    results = {}
+    for route in routes(ids):
+        result = measure(route, repeat, warmup)
+        results[result['endpoint']] = result
+        print('%-28s %-6s %9.2f %9.2f %9.2f %8d %10d' % (
+            result['endpoint'], route.method, result['p50_ms'], result['p90_ms'], result['p99_ms'],
+            result['queries'], result['peak_rss_kb']))
+
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules()} - {'static'}
+    return {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'warmup': warmup,
+            'response_cache': response_cache.backend is not None,
+            'rows': counts,
+        },
+        'peak_rss_kb': peak_rss(),
+        'routes': results,
+        'missing': sorted(endpoints - {result['endpoint'] for result in results.values()}),
+    }
+
+
+def compare(results, baseline, metric, threshold, min_ms):
+    """Regressions of ``results`` against ``baseline``, as messages.
+
+    A route regresses when its ``metric`` latency grew by more than
+    ``threshold`` (and ``min_ms``, sub-millisecond routes being noisy) or
+    when it runs more queries.
+    """
+    if results['meta']['rows'] != baseline['meta']['rows']:
+        raise ValueError('The baseline was taken on other data (%s), refill the database with --scale'
+                         % baseline['meta']['rows'])
+    if results['meta']['response_cache'] != baseline['meta'].get('response_cache'):
+        raise ValueError('The baseline was taken with the response cache %s, run %s --cache'
+                         % (('on', 'with') if baseline['meta'].get('response_cache') else ('off', 'without')))
+    regressions = []
+    for name, before in baseline['routes'].items():
+        after = results['routes'].get(name)
+        if after is None:
+            regressions.append(f'{name} : not measured any more')
+            continue
+        if after[metric] > before[metric] * (1 + threshold) and after[metric] - before[metric] > min_ms:
+            regressions.append('%s : %s %.2fms -> %.2fms (+%.0f%%)' % (
+                name, metric, before[metric], after[metric], (after[metric] / before[metric] - 1) * 100))
+        if after['queries'] > before['queries']:
+            regressions.append('%s : %d -> %d queries' % (name, before['queries'], after['queries']))
+    return regressions
+
+
+def write(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def main(args):
+    use_database(args.database)
+    app.config.update(WTF_CSRF_ENABLED=False, ADMIN_TOKEN=ADMIN_TOKEN)
+    if not args.cache:
+        response_cache.backend = None
+    if args.scale:
+        with app.app_context():
+            upgrade(directory='migrations')
+            generate(SCALES[args.scale], args.seed)
+
+    print('%-28s %-6s %9s %9s %9s %8s %10s' % ('route', 'method', 'p50 ms', 'p90 ms', 'p99 ms', 'queries', 'rss kb'))
+    results = run(args.repeat, args.warmup)
+    write(args.output, results)
+
+    failed = False
+    if results['missing']:
+        print('Routes not benchmarked : ' + ', '.join(results['missing']))
+        failed = True
+    if args.update_baseline or not os.path.exists(args.baseline):
+        write(args.baseline, results)
+        print(f'Baseline stored in {args.baseline}')
+        return failed
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.metric, args.threshold, args.min_ms)
+    for regression in regressions:
+        print('Regression ' + regression)
+    return failed or bool(regressions)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark every route against a stored baseline.')
+    parser.add_argument('--scale', choices=SCALES, help='refill the benchmark database first')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', default=app.config['BENCH_DATABASE_URI'])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--cache', action='store_true', help='keep the response cache on, timing cache hits')
+    parser.add_argument('--output', default='bench/results.json')
+    parser.add_argument('--baseline', default='bench/baseline.json')
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--metric', choices=('p50_ms', 'p90_ms', 'p99_ms', 'mean_ms'), default='p90_ms')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown, 0.25 for 25%%')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='slowdowns below this are noise')
+    try:
+        sys.exit(main(parser.parse_args()))
+    except ValueError as e:
+        sys.exit(str(e))
@@ -0,0 +1,95 @@
+# ----------------------------------------------------------------------------#
+# Benchmark : /venues listing, legacy per-venue grouping vs grouped query.
+#
+# usage : python -m bench.venues [--sizes 1000 10000 50000] [--db]
+# ----------------------------------------------------------------------------#
+
+import argparse
+import random
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from flask import render_template
+
+from app import app, group_venues_by_area, response_cache
+from models import db, Venue
+
+VenueRow = namedtuple('VenueRow', 'city state id name num_upcoming_shows')
+
+
+def legacy_group_venues_by_area(rows):
+    # previous implementation of the venues() grouping, kept for comparison
+    data = []
+    for venue in rows:
+        venue_data = {
+            'id': venue.id,
+            'name': venue.name,
+            'num_upcoming_shows': venue.num_upcoming_shows,
+        }
+        if not any(d['city'] == venue.city and d['state'] == venue.state for d in data):
+            data.append({'city': venue.city, 'state': venue.state, 'venues': [venue_data]})
+        else:
+            for d in data:
+                if d['city'] == venue.city and d['state'] == venue.state:
+                    d['venues'].append(venue_data)
+                    break
+    return data
+
+
+def legacy_venue_rows():
+    # every venue with all its shows joined, upcoming shows counted in python
+    now = datetime.now()
+    return [
+        VenueRow(venue.city, venue.state, venue.id, venue.name,
+                 sum(1 for show in venue.shows if show.start_time > now))
+        for venue in Venue.query.options(db.joinedload(Venue.shows)).all()
+    ]
+
+
+def synthetic_rows(size, seed=42):
+    # roughly one city for every 20 venues, like a real catalog, in the query's order
+    rnd = random.Random(seed)
+    cities = max(size // 20, 1)
+    return sorted((
+        VenueRow('City %d' % (i % cities), 'ST', i, 'Venue %d' % i, rnd.randint(0, 5))
+        for i in range(size)
+    ), key=lambda row: (row.state, row.city, row.id))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def bench_grouping(sizes):
+    print('%10s %14s %14s' % ('venues', 'legacy (ms)', 'grouped (ms)'))
+    for size in sizes:
+        rows = synthetic_rows(size)
+        legacy = timed(legacy_group_venues_by_area, rows)
+        grouped = timed(lambda rows: list(group_venues_by_area(rows)), rows)
+        print('%10d %14.2f %14.2f' % (size, legacy * 1000, grouped * 1000))
+
+
+def bench_database():
+    # compare against whatever catalog the configured database holds, rendered each time
+    response_cache.backend = None
+    with app.test_request_context():
+        legacy = timed(lambda: render_template(
+            'pages/venues.html', areas=legacy_group_venues_by_area(legacy_venue_rows())))
+        client = app.test_client()
+        grouped = timed(lambda: client.get('/venues').get_data())
+        print('%d venues : legacy %.2f ms, /venues %.2f ms'
+              % (Venue.query.count(), legacy * 1000, grouped * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the /venues listing.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--db', action='store_true', help='also time the configured database')
+    args = parser.parse_args()
+
+    bench_grouping(args.sizes)
+    if args.db:
+        bench_database()
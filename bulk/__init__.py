@@ -0,0 +1,23 @@
+# ----------------------------------------------------------------------------#
+# Bulk : catalog import and export, for the CLI and the admin endpoints.
+#
+# The endpoints are only served when ADMIN_TOKEN is configured, to clients
+# sending it as "Authorization: Bearer <token>".
+# ----------------------------------------------------------------------------#
+import hmac
+from functools import wraps
+
+from flask import abort, current_app, request
+
+
+def admin_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('ADMIN_TOKEN')
+        if not token:
+            abort(403)
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(401)
+        return view(*args, **kwargs)
+
+    return wrapper
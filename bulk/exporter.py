@@ -0,0 +1,117 @@
+# ----------------------------------------------------------------------------#
+# Exporter : venues, artists, shows, albums and songs as CSV, NDJSON or
+# columnar row groups.
+#
+# Rows come from a server-side cursor (yield_per) and are written one batch
+# at a time, so memory stays flat however large the table. Dates are
+# written in the forms' '%Y-%m-%d %H:%M:%S' format and genres comma
+# separated in CSV, so exports can be imported back.
+#
+# The columnar format is NDJSON with one row group per line:
+#   {"columns": ["id", "name", ...], "rows": 1000, "data": [[1, 2, ...], ["a", "b", ...]]}
+# ----------------------------------------------------------------------------#
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from itertools import islice
+
+from models import db, Venue, Artist, Show, Album, Song
+
+EXPORTS = {
+    'venues': Venue,
+    'artists': Artist,
+    'shows': Show,
+    'albums': Album,
+    'songs': Song,
+}
+
+# internal bookkeeping, not catalog data
+EXCLUDED_COLUMNS = ('version',)
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'columnar': 'application/x-ndjson',
+}
+
+
+def export_columns(entity):
+    model = EXPORTS[entity]
+    return [column for column in model.__table__.columns if column.name not in EXCLUDED_COLUMNS]
+
+
+def export_batches(entity, batch_size=1000):
+    # lists of rows in id order, streamed from a server-side cursor
+    model = EXPORTS[entity]
+    rows = iter(db.session.query(*export_columns(entity)).order_by(model.id).yield_per(batch_size))
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def export_chunks(entity, format, batch_size=1000, compress=False):
+    """Yield the export of ``entity`` as bytes, a chunk per batch of rows."""
+    names = [column.name for column in export_columns(entity)]
+    chunks = WRITERS[format](names, export_batches(entity, batch_size))
+    if compress:
+        return gzip_chunks(chunks)
+    return (chunk.encode() for chunk in chunks)
+
+
+def write_csv(names, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for batch in batches:
+        writer.writerows([csv_value(value) for value in row] for row in batch)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # header only, the table is empty
+        yield buffer.getvalue()
+
+
+def write_ndjson(names, batches):
+    for batch in batches:
+        yield ''.join(json.dumps(dict(zip(names, row)), default=json_value) + '\n' for row in batch)
+
+
+def write_columnar(names, batches):
+    for batch in batches:
+        yield json.dumps({
+            'columns': names,
+            'rows': len(batch),
+            'data': [list(column) for column in zip(*batch)],
+        }, default=json_value) + '\n'
+
+
+WRITERS = {'csv': write_csv, 'ndjson': write_ndjson, 'columnar': write_columnar}
+
+
+def gzip_chunks(chunks):
+    # one gzip member, flushed as the chunks come
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_value(value):
+    if isinstance(value, list):
+        return ','.join(value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return json_value(value) if isinstance(value, datetime) else value
+
+
+def json_value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
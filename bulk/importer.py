@@ -0,0 +1,265 @@
+# ----------------------------------------------------------------------------#
+# Importer : venues, artists, shows and albums from CSV or NDJSON streams.
+#
+# Rows are checked with the validation rules of the matching form, its inline
+# validate_<field> methods included, bound once per import instead of building
+# a form for every row; references are checked a batch at a time. Rows are
+# then inserted a batch at a time with one multi-row INSERT. A batch the
+# database refuses is retried row by row so only the offending rows are
+# reported.
+# ----------------------------------------------------------------------------#
+import csv
+import inspect
+import json
+import time
+from collections import namedtuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from werkzeug.datastructures import MultiDict
+from wtforms import SelectMultipleField
+from wtforms.fields.core import UnboundField
+from wtforms.meta import DefaultMeta
+
+from forms import VenueForm, ArtistForm, ShowForm, AlbumForm
+from models import db, Venue, Artist, Show, Album
+from models.schedule import with_end_time, find_conflicts
+
+# references : id fields that must point to an existing row of the given model,
+# prepare : completes the values of a valid row,
+# check : maps a batch of values to {index in the batch: [errors]}
+ImportSpec = namedtuple('ImportSpec', 'model form_class references prepare check')
+
+IMPORTS = {
+    'venues': ImportSpec(Venue, VenueForm, {}, None, None),
+    'artists': ImportSpec(Artist, ArtistForm, {}, None, None),
+    'shows': ImportSpec(Show, ShowForm, {'venue_id': Venue, 'artist_id': Artist}, with_end_time, find_conflicts),
+    'albums': ImportSpec(Album, AlbumForm, {'artist_id': Artist}, None, None),
+}
+
+FORMATS = ('csv', 'ndjson')
+
+
+class RowValidator:
+    """Validate plain dict rows against the fields of a form class."""
+
+    def __init__(self, form_class, only, batched=()):
+        # only the fields stored in a column, not the form-only ones (e.g. recurrence)
+        meta = DefaultMeta()
+        self.fields = {
+            name: unbound.bind(form=None, name=name, _meta=meta)
+            for name, unbound in inspect.getmembers(form_class, lambda member: isinstance(member, UnboundField))
+            if name in only
+        }
+        # the form's validate_<field> methods, except those checked a batch at a time
+        self.inline = {
+            name: [getattr(form_class, f'validate_{name}')]
+            for name in self.fields
+            if name not in batched and hasattr(form_class, f'validate_{name}')
+        }
+
+    def __getattr__(self, name):
+        # inline validators read the other fields of the row, e.g. self.start_time
+        try:
+            return self.__dict__['fields'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    def validate(self, row):
+        # returns (values, errors), errors maps field names to messages
+        formdata = MultiDict()
+        for name, field in self.fields.items():
+            value = row.get(name)
+            if value is None:
+                continue
+            if isinstance(field, SelectMultipleField) and isinstance(value, str):
+                # csv cells hold multiple values comma separated
+                value = [part.strip() for part in value.split(',') if part.strip()]
+            for item in value if isinstance(value, list) else [value]:
+                formdata.add(name, str(item).lower() if isinstance(item, bool) else str(item))
+
+        # no form defaults : a missing value is missing
+        for field in self.fields.values():
+            field.process(formdata, data=None)
+
+        values = {}
+        errors = {}
+        for name, field in self.fields.items():
+            if field.validate(self, self.inline.get(name, ())):
+                values[name] = field.data
+            else:
+                errors[name] = list(field.errors)
+        return values, errors
+
+
+class ImportReport:
+    def __init__(self, max_errors=1000):
+        self.rows = 0
+        self.inserted = 0
+        self.errors = []
+        self.error_count = 0
+        # ids referenced by the inserted rows, to invalidate their pages
+        self.references = {}
+        self.max_errors = max_errors
+        self.started = time.perf_counter()
+        self.seconds = 0
+
+    def error(self, line, messages):
+        # keep the first max_errors errors, count the rest
+        self.error_count += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': messages})
+
+    def sorted_errors(self):
+        # reference errors are found a batch later than validation errors
+        return sorted(self.errors, key=lambda error: error['line'])
+
+    def tick(self):
+        self.seconds = time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'error_count': self.error_count,
+            'errors': self.sorted_errors(),
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def read_csv(stream):
+    reader = csv.DictReader(stream)
+    for row in reader:
+        # blank cells are missing values
+        yield reader.line_num, {name: value for name, value in row.items() if value not in ('', None)}, None
+
+
+def read_ndjson(stream):
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, f'Invalid JSON: {e}'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'Expected a JSON object'
+            continue
+        yield number, row, None
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson}
+
+
+def import_rows(entity, stream, format, batch_size=1000, max_errors=1000, progress=None):
+    """Import a text stream of ``entity`` rows, returns an ImportReport.
+
+    ``progress`` is called with the report after every batch.
+    """
+    spec = IMPORTS[entity]
+    validator = RowValidator(spec.form_class, spec.model.__table__.columns.keys(), batched=spec.references)
+    report = ImportReport(max_errors)
+
+    batch = []
+    for line, row, error in READERS[format](stream):
+        report.rows += 1
+        if error:
+            report.error(line, {'row': [error]})
+            continue
+
+        values, errors = validator.validate(row)
+        for name in spec.references:
+            if name in values:
+                try:
+                    values[name] = int(values[name])
+                except (TypeError, ValueError):
+                    errors.setdefault(name, []).append('Not a valid id.')
+        if errors:
+            report.error(line, errors)
+            continue
+
+        if spec.prepare:
+            values = spec.prepare(values)
+        batch.append((line, values))
+        if len(batch) >= batch_size:
+            insert_batch(spec, batch, report)
+            batch = []
+            report.tick()
+            if progress:
+                progress(report)
+
+    if batch:
+        insert_batch(spec, batch, report)
+    report.tick()
+    if progress:
+        progress(report)
+    return report
+
+
+def insert_batch(spec, batch, report):
+    batch = check_references(spec, batch, report)
+    if spec.check and batch:
+        errors = spec.check([values for _, values in batch])
+        for index in sorted(errors):
+            report.error(batch[index][0], {'row': errors[index]})
+        batch = [item for index, item in enumerate(batch) if index not in errors]
+    if not batch:
+        return
+    table = spec.model.__table__
+    try:
+        db.session.execute(table.insert().values([values for _, values in batch]))
+        db.session.commit()
+        report.inserted += len(batch)
+        for name in spec.references:
+            report.references.setdefault(name, set()).update(values[name] for _, values in batch)
+    except SQLAlchemyError:
+        db.session.rollback()
+        # find the offending rows one at a time
+        for line, values in batch:
+            try:
+                db.session.execute(table.insert().values(values))
+                db.session.commit()
+                report.inserted += 1
+                for name in spec.references:
+                    report.references.setdefault(name, set()).add(values[name])
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                report.error(line, {'row': [str(getattr(e, 'orig', None) or e).strip()]})
+
+
+def check_references(spec, batch, report):
+    # drop rows pointing to missing venues or artists, one query per reference
+    for name, model in spec.references.items():
+        ids = {values[name] for _, values in batch}
+        existing = {id for id, in db.session.query(model.id).filter(model.id.in_(ids))}
+        missing = ids - existing
+        if missing:
+            for line, values in batch:
+                if values[name] in missing:
+                    report.error(line, {name: [f'{model.__name__} {values[name]} does not exist.']})
+            batch = [(line, values) for line, values in batch if values[name] not in missing]
+    return batch
+
+
+def guess_format(filename, content_type=None):
+    # from the file extension, then the content type
+    if filename:
+        extension = filename.rsplit('.', 1)[-1].lower()
+        if extension in ('ndjson', 'jsonl'):
+            return 'ndjson'
+        if extension == 'csv':
+            return 'csv'
+    if content_type:
+        if 'ndjson' in content_type or 'jsonlines' in content_type:
+            return 'ndjson'
+        if 'csv' in content_type:
+            return 'csv'
+    return None
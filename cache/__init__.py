@@ -0,0 +1,289 @@
+# ----------------------------------------------------------------------------#
+# Response cache : read-only pages cached by route and arguments.
+#
+# Entries are keyed by endpoint, view arguments, query string and locale, plus
+# the current token of every tag the page depends on ('venue:3', 'shows', ...).
+# Invalidating a tag replaces its token, so every dependent key changes at
+# once and the stale entries simply age out of the backend.
+# ----------------------------------------------------------------------------#
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from flask import abort, current_app, make_response, request, session
+from werkzeug.http import parse_date
+
+from utils import request_locale
+
+
+class LRUCache:
+    """In-process backend, least recently used entries evicted past ``max_entries``."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl if ttl else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class FileCache:
+    """File backed backend, shared by every worker process on the host."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as file:
+                expires_at, value = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        # write to a temporary file then rename, so readers never see half an entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump((time.time() + ttl if ttl else None, value), file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+
+class ResponseCache:
+    """Caches GET responses of decorated views and counts hits and misses.
+
+    Configured by RESPONSE_CACHE_BACKEND ('memory', 'file' or None to
+    disable), RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES and
+    RESPONSE_CACHE_DIR.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.ttl = None
+        self.max_streamed_size = None
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('RESPONSE_CACHE_BACKEND')
+        if backend == 'memory':
+            self.backend = LRUCache(app.config['RESPONSE_CACHE_MAX_ENTRIES'])
+        elif backend == 'file':
+            self.backend = FileCache(app.config['RESPONSE_CACHE_DIR'])
+        elif backend is not None:
+            raise ValueError(f'Unknown RESPONSE_CACHE_BACKEND {backend!r}')
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL')
+        self.max_streamed_size = app.config.get('RESPONSE_CACHE_MAX_STREAMED_SIZE')
+        app.extensions['response_cache'] = self
+
+    def cached(self, tags):
+        """Cache a view; ``tags`` maps the view arguments to the tags it depends on."""
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**view_args):
+                # pending flash messages are rendered once, for this visitor only
+                if self.backend is None or request.method != 'GET' or '_flashes' in session:
+                    return view(**view_args)
+
+                key = self._key(request.endpoint, view_args, tags(**view_args))
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self.hits[request.endpoint] += 1
+                    data, status, headers = entry
+                    return vary_on_locale(current_app.response_class(data, status, headers))
+
+                self.misses[request.endpoint] += 1
+                response = make_response(view(**view_args))
+                if response.status_code == 200 and not response.is_streamed:
+                    self.backend.set(key, (response.get_data(), response.status_code,
+                                           [('Content-Type', response.content_type)]), self.ttl)
+                elif response.status_code == 200 and self.max_streamed_size:
+                    response.response = self._tee(key, response.iter_encoded(),
+                                                  [('Content-Type', response.content_type)])
+                return vary_on_locale(response)
+
+            return wrapper
+
+        return decorator
+
+    def versioned(self, etag_for, ttl=None):
+        """Cache a view for as long as ``etag_for`` maps its arguments to the same etag.
+
+        No invalidation needed : a new version is a new key. Answers
+        If-None-Match, and If-Modified-Since against the time the cached
+        body was generated, before the view runs.
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(**view_args):
+                etag = etag_for(**view_args)
+                if etag is None:
+                    abort(404)
+                etag = f'{etag}-{request_locale()}'
+
+                key = f'{self._key(request.endpoint, view_args, [])}|{etag}'
+                fresh = request.if_none_match.contains(etag)
+                entry = None
+                if not fresh and self.backend is not None:
+                    entry = self.backend.get(key)
+                    # If-Modified-Since only counts without an If-None-Match
+                    fresh = entry is not None and not request.if_none_match and not_modified_since(entry)
+                # answered here, as make_conditional would buffer a streamed body
+                if fresh:
+                    response = current_app.response_class(status=304)
+                elif entry is not None:
+                    self.hits[request.endpoint] += 1
+                    data, status, headers = entry
+                    response = current_app.response_class(data, status, headers)
+                else:
+                    self.misses[request.endpoint] += 1
+                    response = make_response(view(**view_args))
+                    response.last_modified = datetime.utcnow().replace(microsecond=0)
+                    if response.status_code == 200 and self.backend is not None:
+                        headers = [('Content-Type', response.content_type),
+                                   ('Last-Modified', response.headers['Last-Modified'])]
+                        if response.is_streamed:
+                            if self.max_streamed_size:
+                                response.response = self._tee(key, response.iter_encoded(), headers, ttl)
+                        else:
+                            self.backend.set(key, (response.get_data(), 200, headers), ttl)
+
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'no-cache'
+                return vary_on_locale(response)
+
+            return wrapper
+
+        return decorator
+
+    def invalidate(self, *tags):
+        # replace the tokens, every key built from the old ones becomes unreachable
+        if self.backend is None:
+            return
+        for tag in tags:
+            self.backend.set('tag:' + tag, uuid.uuid4().hex)
+
+    def stats(self):
+        endpoints = sorted(set(self.hits) | set(self.misses))
+        return {
+            endpoint: {'hits': self.hits[endpoint], 'misses': self.misses[endpoint]}
+            for endpoint in endpoints
+        }
+
+    def _tee(self, key, chunks, headers, ttl=None):
+        # store a streamed page once fully sent, giving up past max_streamed_size
+        size = 0
+        data = []
+        for chunk in chunks:
+            if data is not None:
+                size += len(chunk)
+                if size <= self.max_streamed_size:
+                    data.append(chunk)
+                else:
+                    data = None
+            yield chunk
+        if data is not None:
+            self.backend.set(key, (b''.join(data), 200, headers), ttl or self.ttl)
+
+    def _key(self, endpoint, view_args, tags):
+        tokens = []
+        for tag in tags:
+            token = self.backend.get('tag:' + tag)
+            if token is None:
+                token = uuid.uuid4().hex
+                self.backend.set('tag:' + tag, token)
+            tokens.append(token)
+        return '|'.join([
+            endpoint,
+            repr(sorted(view_args.items())),
+            repr(sorted(request.args.items(multi=True))),
+            request_locale(),
+            *tokens
+        ])
+
+
+def conditional(etag_for):
+    """Answer If-None-Match with a 304 before the view does any work.
+
+    ``etag_for`` maps the view arguments to the page's strong etag, or None
+    when the entity does not exist.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**view_args):
+            etag = etag_for(**view_args)
+            if etag is None:
+                abort(404)
+            etag = f'{etag}-{request_locale()}'
+
+            if request.if_none_match.contains(etag) and '_flashes' not in session:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(**view_args))
+            response.set_etag(etag)
+            # browsers may keep the page but must revalidate it on each visit
+            response.headers['Cache-Control'] = 'no-cache'
+            return vary_on_locale(response)
+
+        return wrapper
+
+    return decorator
+
+
+def not_modified_since(entry):
+    # If-Modified-Since against the Last-Modified of a cached entry
+    last_modified = parse_date(dict(entry[2]).get('Last-Modified'))
+    return request.if_modified_since is not None and last_modified is not None \
+        and last_modified <= request.if_modified_since
+
+
+def vary_on_locale(response):
+    # pages are rendered in the locale negotiated from Accept-Language
+    response.vary.add('Accept-Language')
+    return response
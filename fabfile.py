@@ -5,9 +5,11 @@ from fabric.contrib.console import confirm
 
 
 def test():
+    # index checks, every route against the stored benchmark baseline, then the query
+    # count checks on the benchmark database the suite filled
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python -m bench.explain && python -m bench.suite --scale 1k && python -m bench.queries", capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
@@ -39,9 +41,8 @@ def heroku():
 
 
 def heroku_test():
-    local(
-        "heroku run python test_tasks.py -v && heroku run python test_users.py -v"
-    )
+    # read only : the suite writes to the database it runs against
+    local("heroku run python -m bench.explain")
 
 
 def deploy():
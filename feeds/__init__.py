@@ -0,0 +1,101 @@
+# ----------------------------------------------------------------------------#
+# Feeds : iCalendar (RFC 5545) feeds of the shows of a venue or an artist.
+#
+# Recent and upcoming shows are read in start order off the
+# (venue_id, start_time) and (artist_id, start_time) indexes and written one
+# VEVENT at a time. Show times are stored without a time zone, so events use
+# floating local times.
+# ----------------------------------------------------------------------------#
+from datetime import datetime, timedelta
+
+from flask import current_app, request, url_for
+
+from models import db, Artist, Show, Venue
+
+CRLF = '\r\n'
+
+
+def venue_calendar(venue, now=None):
+    # shows at the venue, each named after its artist
+    shows = calendar_shows(Show.venue_id == venue.id, now).add_columns(Artist.name.label('artist_name'))
+    location = ', '.join(part for part in (venue.name, venue.address, venue.city, venue.state) if part)
+    stamp = datetime.utcnow()
+    return calendar(venue.name, (
+        event(show, f'{show.artist_name} at {venue.name}', location,
+              url_for('show_artist', artist_id=show.artist_id, _external=True), stamp)
+        for show in shows
+    ))
+
+
+def artist_calendar(artist, now=None):
+    # shows of the artist, each located at its venue
+    shows = calendar_shows(Show.artist_id == artist.id, now).add_columns(
+        Venue.name.label('venue_name'), Venue.address, Venue.city, Venue.state)
+    stamp = datetime.utcnow()
+    return calendar(artist.name, (
+        event(show, f'{artist.name} at {show.venue_name}',
+              ', '.join(part for part in (show.venue_name, show.address, show.city, show.state) if part),
+              url_for('show_venue', venue_id=show.venue_id, _external=True), stamp)
+        for show in shows
+    ))
+
+
+def calendar_shows(criterion, now):
+    # upcoming shows and the last CALENDAR_PAST_DAYS of past ones, streamed in start order
+    now = now if now is not None else db.func.localtimestamp()
+    since = now - timedelta(days=current_app.config['CALENDAR_PAST_DAYS'])
+    return db.session.query(Show.id, Show.venue_id, Show.artist_id, Show.start_time, Show.end_time) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id) \
+        .filter(criterion, Show.start_time >= since) \
+        .order_by(Show.start_time, Show.id) \
+        .yield_per(current_app.config['LISTING_STREAM_BATCH_SIZE'])
+
+
+def calendar(name, events):
+    yield content_lines(
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Fyyur//Shows//EN',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{escape(name)}',
+    )
+    yield from events
+    yield content_lines('END:VCALENDAR')
+
+
+def event(show, summary, location, url, stamp):
+    return content_lines(
+        'BEGIN:VEVENT',
+        f'UID:show-{show.id}@{request.host}',
+        f'DTSTAMP:{stamp:%Y%m%dT%H%M%SZ}',
+        f'DTSTART:{show.start_time:%Y%m%dT%H%M%S}',
+        f'DTEND:{show.end_time:%Y%m%dT%H%M%S}',
+        f'SUMMARY:{escape(summary)}',
+        f'LOCATION:{escape(location)}',
+        f'URL:{url}',
+        'END:VEVENT',
+    )
+
+
+def content_lines(*lines):
+    return ''.join(fold(line) + CRLF for line in lines)
+
+
+def fold(line):
+    # lines longer than 75 octets continue on the next line after a space
+    if len(line.encode()) <= 75:
+        return line
+    parts = []
+    part = ''
+    for char in line:
+        if len((part + char).encode()) > (75 if not parts else 74):
+            parts.append(part)
+            part = ''
+        part += char
+    parts.append(part)
+    return (CRLF + ' ').join(parts)
+
+
+def escape(text):
+    return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
@@ -1,22 +1,103 @@
 from datetime import datetime
+from itertools import islice
 
+from dateutil.rrule import rrulestr
+from flask import current_app
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, URL, Regexp
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField, \
+    TextAreaField
+from wtforms.validators import DataRequired, URL, Regexp, Optional, NumberRange, ValidationError
+
+from models import db, Venue, Artist
+
+
+class TourField(TextAreaField):
+    """Tour stops, one "venue_id, YYYY-MM-DD HH:MM" per line, as (venue_id, start_time) pairs."""
+
+    formats = ('%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S')
+
+    def process_formdata(self, valuelist):
+        self.data = []
+        if not valuelist:
+            return
+        for number, line in enumerate(valuelist[0].splitlines(), 1):
+            if not line.strip():
+                continue
+            venue_id, _, start_time = line.partition(',')
+            try:
+                self.data.append((int(venue_id), self.parse_datetime(start_time.strip())))
+            except ValueError:
+                raise ValueError(f'Line {number} : expected "venue_id, YYYY-MM-DD HH:MM".')
+
+    def parse_datetime(self, value):
+        for format in self.formats:
+            try:
+                return datetime.strptime(value, format)
+            except ValueError:
+                pass
+        raise ValueError(value)
+
+    def _value(self):
+        return self.raw_data[0] if self.raw_data else ''
 
 
 class ShowForm(Form):
-    artist_id = StringField(
-        'artist_id'
+    artist_id = IntegerField(
+        'artist_id', validators=[DataRequired()]
     )
-    venue_id = StringField(
-        'venue_id'
+    venue_id = IntegerField(
+        'venue_id', validators=[DataRequired()]
     )
     start_time = DateTimeField(
         'start_time',
         validators=[DataRequired()],
         default=datetime.today()
     )
+    # defaults to SHOW_DEFAULT_DURATION after the start
+    end_time = DateTimeField(
+        'end_time', validators=[Optional()]
+    )
+    # batch scheduling : the show repeated by an RRULE, plus tour stops at other venues
+    recurrence = StringField(
+        'recurrence', validators=[Optional()]
+    )
+    tour = TourField(
+        'tour', validators=[Optional()]
+    )
+
+    def validate_artist_id(self, field):
+        if not db.session.query(Artist.query.filter_by(id=field.data).exists()).scalar():
+            raise ValidationError(f'There is no artist {field.data}.')
+
+    def validate_venue_id(self, field):
+        if not db.session.query(Venue.query.filter_by(id=field.data).exists()).scalar():
+            raise ValidationError(f'There is no venue {field.data}.')
+
+    def validate_end_time(self, field):
+        if field.data and self.start_time.data and field.data <= self.start_time.data:
+            raise ValidationError('The show must end after it starts.')
+
+    def validate_recurrence(self, field):
+        # expands the rule into field.occurrences, bounded by SHOW_BATCH_MAX
+        field.occurrences = None
+        if not field.data or self.start_time.data is None:
+            return
+        limit = current_app.config['SHOW_BATCH_MAX']
+        try:
+            occurrences = list(islice(rrulestr(field.data, dtstart=self.start_time.data), limit + 1))
+        except (ValueError, TypeError):
+            raise ValidationError('Not a recurrence rule, e.g. FREQ=WEEKLY;COUNT=8.')
+        if len(occurrences) > limit:
+            raise ValidationError(f'The rule must end (COUNT or UNTIL) within {limit} shows.')
+        if not occurrences:
+            raise ValidationError('The rule has no occurrence.')
+        field.occurrences = occurrences
+
+    def validate_tour(self, field):
+        venue_ids = {venue_id for venue_id, _ in field.data or ()}
+        found = {id for id, in db.session.query(Venue.id).filter(Venue.id.in_(venue_ids))} if venue_ids else set()
+        if venue_ids - found:
+            raise ValidationError(f'There is no venue {", ".join(map(str, sorted(venue_ids - found)))}.')
 
 
 class VenueForm(Form):
@@ -274,3 +355,7 @@ class SongForm(Form):
     duration = StringField(
         'duration', validators=[DataRequired(), Regexp('^[0-9]*$')]
     )
+
+    position = IntegerField(
+        'position', validators=[Optional(), NumberRange(min=1)]
+    )
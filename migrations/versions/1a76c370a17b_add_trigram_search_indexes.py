@@ -0,0 +1,40 @@
+"""add trigram search indexes
+
+Revision ID: 1a76c370a17b
+Revises: 3fb8619055ee
+Create Date: 2026-10-18 10:03:27.114902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1a76c370a17b'
+down_revision = '3fb8619055ee'
+branch_labels = None
+depends_on = None
+
+SEARCH_INDEXES = [
+    ('ix_venues_name_trgm', 'venues', 'name'),
+    ('ix_venues_city_trgm', 'venues', 'city'),
+    ('ix_venues_state_trgm', 'venues', 'state'),
+    ('ix_artists_name_trgm', 'artists', 'name'),
+    ('ix_artists_city_trgm', 'artists', 'city'),
+    ('ix_artists_state_trgm', 'artists', 'state'),
+]
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # gin_trgm_ops indexes serve ILIKE '%term%' and similarity() ranking
+    with op.get_context().autocommit_block():
+        for name, table, column in SEARCH_INDEXES:
+            op.create_index(name, table, [column], unique=False, postgresql_using='gin',
+                            postgresql_ops={column: 'gin_trgm_ops'}, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, column in reversed(SEARCH_INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,33 @@
+"""add stored track position to songs
+
+Revision ID: 1fa31468f323
+Revises: f8a347d3491e
+Create Date: 2026-10-18 13:20:52.641387
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1fa31468f323'
+down_revision = 'f8a347d3491e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('songs', sa.Column('position', sa.Integer(), nullable=True))
+    # number existing tracks in insertion order, as the albums listed them so far
+    op.execute("""
+        UPDATE songs SET position = numbered.position
+        FROM (SELECT id, row_number() OVER (PARTITION BY album_id ORDER BY id) AS position FROM songs) AS numbered
+        WHERE songs.id = numbered.id
+    """)
+    op.alter_column('songs', 'position', nullable=False)
+    op.create_index('ix_songs_album_id_position', 'songs', ['album_id', 'position'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_songs_album_id_position', table_name='songs')
+    op.drop_column('songs', 'position')
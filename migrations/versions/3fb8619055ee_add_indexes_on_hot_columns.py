@@ -0,0 +1,47 @@
+"""add indexes on hot filter and join columns
+
+Revision ID: 3fb8619055ee
+Revises: 03cf792fa140
+Create Date: 2026-10-18 09:12:41.508213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3fb8619055ee'
+down_revision = '03cf792fa140'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block,
+    # it lets the indexes build without locking writes on a live table
+    with op.get_context().autocommit_block():
+        op.create_index('ix_shows_venue_id_start_time', 'shows', ['venue_id', 'start_time'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_shows_start_time_id', 'shows', ['start_time', 'id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_albums_artist_id', 'albums', ['artist_id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_songs_album_id', 'songs', ['album_id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_venues_genres', 'venues', ['genres'],
+                        unique=False, postgresql_using='gin', postgresql_concurrently=True)
+        op.create_index('ix_artists_genres', 'artists', ['genres'],
+                        unique=False, postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_artists_genres', table_name='artists', postgresql_concurrently=True)
+        op.drop_index('ix_venues_genres', table_name='venues', postgresql_concurrently=True)
+        op.drop_index('ix_songs_album_id', table_name='songs', postgresql_concurrently=True)
+        op.drop_index('ix_albums_artist_id', table_name='albums', postgresql_concurrently=True)
+        op.drop_index('ix_shows_start_time_id', table_name='shows', postgresql_concurrently=True)
+        op.drop_index('ix_shows_artist_id_start_time', table_name='shows', postgresql_concurrently=True)
+        op.drop_index('ix_shows_venue_id_start_time', table_name='shows', postgresql_concurrently=True)
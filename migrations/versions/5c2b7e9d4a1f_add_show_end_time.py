@@ -0,0 +1,52 @@
+"""add show end time and booking exclusion constraints
+
+Revision ID: 5c2b7e9d4a1f
+Revises: 71395651639b
+Create Date: 2026-10-18 16:42:10.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2b7e9d4a1f'
+down_revision = '71395651639b'
+branch_labels = None
+depends_on = None
+
+BOOKING_CONSTRAINTS = [
+    ('ex_shows_venue_booking', 'venue_id'),
+    ('ex_shows_artist_booking', 'artist_id'),
+]
+
+
+def upgrade():
+    # btree_gist lets the gist exclusion constraints compare ids with =
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('shows', sa.Column('end_time', sa.DateTime(), nullable=True))
+    # existing shows last three hours, cut short by the next show at the same venue or of
+    # the same artist so that the constraints hold for past double bookings
+    op.execute("""
+        UPDATE shows SET end_time = least(
+            shows.start_time + interval '3 hours', following.next_at_venue, following.next_by_artist)
+        FROM (
+            SELECT id,
+                   lead(start_time) OVER (PARTITION BY venue_id ORDER BY start_time, id) AS next_at_venue,
+                   lead(start_time) OVER (PARTITION BY artist_id ORDER BY start_time, id) AS next_by_artist
+            FROM shows
+        ) AS following
+        WHERE shows.id = following.id
+    """)
+    op.alter_column('shows', 'end_time', nullable=False)
+    op.create_check_constraint('ck_shows_end_time', 'shows', 'end_time >= start_time')
+    for name, column in BOOKING_CONSTRAINTS:
+        op.execute(f'ALTER TABLE shows ADD CONSTRAINT {name} '
+                   f'EXCLUDE USING gist ({column} WITH =, tsrange(start_time, end_time) WITH &&)')
+
+
+def downgrade():
+    for name, column in reversed(BOOKING_CONSTRAINTS):
+        op.drop_constraint(name, 'shows')
+    op.drop_constraint('ck_shows_end_time', 'shows')
+    op.drop_column('shows', 'end_time')
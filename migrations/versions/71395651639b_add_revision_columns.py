@@ -0,0 +1,46 @@
+"""add revision columns for etags
+
+Revision ID: 71395651639b
+Revises: 1fa31468f323
+Create Date: 2026-10-18 14:37:05.882613
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '71395651639b'
+down_revision = '1fa31468f323'
+branch_labels = None
+depends_on = None
+
+REVISED_TABLES = ['venues', 'artists', 'shows', 'albums', 'songs']
+
+
+def upgrade():
+    # every insert and update draws a new number from one shared sequence
+    op.execute('CREATE SEQUENCE revision_seq')
+    op.execute("""
+        CREATE FUNCTION bump_revision() RETURNS trigger AS $$
+        BEGIN
+            NEW.revision := nextval('revision_seq');
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    for table in REVISED_TABLES:
+        op.add_column(table, sa.Column('revision', sa.BigInteger(), nullable=False,
+                                       server_default=sa.text("nextval('revision_seq')")))
+        op.execute(f"""
+            CREATE TRIGGER {table}_bump_revision BEFORE UPDATE ON {table}
+                FOR EACH ROW EXECUTE PROCEDURE bump_revision();
+        """)
+
+
+def downgrade():
+    for table in reversed(REVISED_TABLES):
+        op.execute(f'DROP TRIGGER {table}_bump_revision ON {table}')
+        op.drop_column(table, 'revision')
+    op.execute('DROP FUNCTION bump_revision()')
+    op.execute('DROP SEQUENCE revision_seq')
@@ -0,0 +1,81 @@
+"""count upcoming shows from the roll-forward watermark
+
+Revision ID: 9d41c6b2e8f3
+Revises: 5c2b7e9d4a1f
+Create Date: 2026-10-18 18:05:42.611927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d41c6b2e8f3'
+down_revision = '5c2b7e9d4a1f'
+branch_labels = None
+depends_on = None
+
+# Upcoming counts were taken against LOCALTIMESTAMP at write time, so a show
+# counted as upcoming, started, then deleted or moved before the roll forward
+# was never subtracted. Counts now hold the shows starting after
+# counter_state.rolled_at, which only the roll forward moves: the triggers
+# and the roll forward always agree on what was counted.
+SHOWS_UPCOMING_COUNT = """
+CREATE OR REPLACE FUNCTION shows_upcoming_count() RETURNS trigger AS $$
+DECLARE
+    since timestamp := (SELECT rolled_at FROM counter_state WHERE id = 1);
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE venues SET upcoming_show_count = upcoming_show_count - delta.n
+        FROM (SELECT venue_id, count(*) AS n FROM old_shows
+              WHERE start_time > since GROUP BY venue_id) AS delta
+        WHERE venues.id = delta.venue_id;
+        UPDATE artists SET upcoming_show_count = upcoming_show_count - delta.n
+        FROM (SELECT artist_id, count(*) AS n FROM old_shows
+              WHERE start_time > since GROUP BY artist_id) AS delta
+        WHERE artists.id = delta.artist_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE venues SET upcoming_show_count = upcoming_show_count + delta.n
+        FROM (SELECT venue_id, count(*) AS n FROM new_shows
+              WHERE start_time > since GROUP BY venue_id) AS delta
+        WHERE venues.id = delta.venue_id;
+        UPDATE artists SET upcoming_show_count = upcoming_show_count + delta.n
+        FROM (SELECT artist_id, count(*) AS n FROM new_shows
+              WHERE start_time > since GROUP BY artist_id) AS delta
+        WHERE artists.id = delta.artist_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+PREVIOUS_SHOWS_UPCOMING_COUNT = SHOWS_UPCOMING_COUNT.replace(
+    "DECLARE\n    since timestamp := (SELECT rolled_at FROM counter_state WHERE id = 1);\n", ''
+).replace('start_time > since', 'start_time > LOCALTIMESTAMP')
+
+RECOUNT = """
+UPDATE venues SET upcoming_show_count = (
+    SELECT count(*) FROM shows WHERE shows.venue_id = venues.id AND shows.start_time > {since});
+UPDATE artists SET upcoming_show_count = (
+    SELECT count(*) FROM shows WHERE shows.artist_id = artists.id AND shows.start_time > {since});
+"""
+
+
+def upgrade():
+    op.create_table('counter_state',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('rolled_at', sa.DateTime(), nullable=False),
+                    sa.CheckConstraint('id = 1', name='ck_counter_state_single_row'),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.execute('LOCK TABLE shows IN SHARE ROW EXCLUSIVE MODE')
+    op.execute('INSERT INTO counter_state (id, rolled_at) VALUES (1, LOCALTIMESTAMP)')
+    op.execute(SHOWS_UPCOMING_COUNT)
+    op.execute(RECOUNT.format(since='(SELECT rolled_at FROM counter_state WHERE id = 1)'))
+
+
+def downgrade():
+    op.execute(PREVIOUS_SHOWS_UPCOMING_COUNT)
+    op.execute(RECOUNT.format(since='LOCALTIMESTAMP'))
+    op.drop_table('counter_state')
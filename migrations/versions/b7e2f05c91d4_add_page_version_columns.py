@@ -0,0 +1,172 @@
+"""add trigger maintained page versions to venues, artists and albums, drop row revisions
+
+Revision ID: b7e2f05c91d4
+Revises: 9d41c6b2e8f3
+Create Date: 2026-10-18 19:12:27.530418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2f05c91d4'
+down_revision = '9d41c6b2e8f3'
+branch_labels = None
+depends_on = None
+
+VERSIONED_TABLES = ['venues', 'artists', 'albums']
+
+# the per row revisions of 71395651639b, which the versions replace
+REVISED_TABLES = ['venues', 'artists', 'shows', 'albums', 'songs']
+
+# A version draws a new number from revision_seq whenever its row, or a row
+# shown on its page, changes: its shows, the names and images of the artists
+# or venues of those shows, its albums, its songs. Shows, albums and songs
+# touch their parents once per statement; venues and artists touch the pages
+# showing them only when a displayed column changes, so touching a version
+# never cascades back.
+VERSION_FUNCTIONS = """
+CREATE FUNCTION bump_version() RETURNS trigger AS $$
+BEGIN
+    NEW.version := nextval('revision_seq');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION shows_touch_versions() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE venues SET version = nextval('revision_seq') WHERE id IN (SELECT venue_id FROM old_shows);
+        UPDATE artists SET version = nextval('revision_seq') WHERE id IN (SELECT artist_id FROM old_shows);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE venues SET version = nextval('revision_seq') WHERE id IN (SELECT venue_id FROM new_shows);
+        UPDATE artists SET version = nextval('revision_seq') WHERE id IN (SELECT artist_id FROM new_shows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION albums_touch_versions() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE artists SET version = nextval('revision_seq') WHERE id IN (SELECT artist_id FROM old_albums);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE artists SET version = nextval('revision_seq') WHERE id IN (SELECT artist_id FROM new_albums);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION songs_touch_versions() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE albums SET version = nextval('revision_seq') WHERE id IN (SELECT album_id FROM old_songs);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE albums SET version = nextval('revision_seq') WHERE id IN (SELECT album_id FROM new_songs);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION venues_touch_versions() RETURNS trigger AS $$
+BEGIN
+    UPDATE artists SET version = nextval('revision_seq')
+    WHERE id IN (SELECT artist_id FROM shows WHERE venue_id = NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION artists_touch_versions() RETURNS trigger AS $$
+BEGIN
+    UPDATE venues SET version = nextval('revision_seq')
+    WHERE id IN (SELECT venue_id FROM shows WHERE artist_id = NEW.id);
+    UPDATE albums SET version = nextval('revision_seq') WHERE artist_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+TOUCHING_TABLES = [
+    ('shows', 'shows_touch_versions'),
+    ('albums', 'albums_touch_versions'),
+    ('songs', 'songs_touch_versions'),
+]
+
+# the columns the other pages display
+DISPLAYED_COLUMNS = [
+    ('venues', 'venues_touch_versions', ['name', 'image_link', 'address', 'city', 'state']),
+    ('artists', 'artists_touch_versions', ['name', 'image_link']),
+]
+
+
+def upgrade():
+    for table in REVISED_TABLES:
+        op.execute(f'DROP TRIGGER {table}_bump_revision ON {table}')
+        op.drop_column(table, 'revision')
+    op.execute('DROP FUNCTION bump_revision()')
+
+    op.execute(VERSION_FUNCTIONS)
+    for table in VERSIONED_TABLES:
+        op.add_column(table, sa.Column('version', sa.BigInteger(), nullable=False,
+                                       server_default=sa.text("nextval('revision_seq')")))
+        op.execute(f"""
+            CREATE TRIGGER {table}_bump_version BEFORE UPDATE ON {table}
+                FOR EACH ROW EXECUTE PROCEDURE bump_version();
+        """)
+    for table, function in TOUCHING_TABLES:
+        op.execute(f"""
+            CREATE TRIGGER {table}_touch_insert AFTER INSERT ON {table}
+                REFERENCING NEW TABLE AS new_{table}
+                FOR EACH STATEMENT EXECUTE PROCEDURE {function}();
+            CREATE TRIGGER {table}_touch_update AFTER UPDATE ON {table}
+                REFERENCING OLD TABLE AS old_{table} NEW TABLE AS new_{table}
+                FOR EACH STATEMENT EXECUTE PROCEDURE {function}();
+            CREATE TRIGGER {table}_touch_delete AFTER DELETE ON {table}
+                REFERENCING OLD TABLE AS old_{table}
+                FOR EACH STATEMENT EXECUTE PROCEDURE {function}();
+        """)
+    for table, function, columns in DISPLAYED_COLUMNS:
+        old = ', '.join(f'OLD.{column}' for column in columns)
+        new = ', '.join(f'NEW.{column}' for column in columns)
+        op.execute(f"""
+            CREATE TRIGGER {table}_touch_update AFTER UPDATE ON {table}
+                FOR EACH ROW WHEN (({old}) IS DISTINCT FROM ({new}))
+                EXECUTE PROCEDURE {function}();
+        """)
+
+
+def downgrade():
+    for table, function, _ in reversed(DISPLAYED_COLUMNS):
+        op.execute(f'DROP TRIGGER {table}_touch_update ON {table}')
+    for table, function in reversed(TOUCHING_TABLES):
+        op.execute(f"""
+            DROP TRIGGER {table}_touch_delete ON {table};
+            DROP TRIGGER {table}_touch_update ON {table};
+            DROP TRIGGER {table}_touch_insert ON {table};
+        """)
+    for table in reversed(VERSIONED_TABLES):
+        op.execute(f'DROP TRIGGER {table}_bump_version ON {table}')
+        op.drop_column(table, 'version')
+    for function in ['artists_touch_versions', 'venues_touch_versions', 'songs_touch_versions',
+                     'albums_touch_versions', 'shows_touch_versions', 'bump_version']:
+        op.execute(f'DROP FUNCTION {function}()')
+
+    op.execute("""
+        CREATE FUNCTION bump_revision() RETURNS trigger AS $$
+        BEGIN
+            NEW.revision := nextval('revision_seq');
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    for table in REVISED_TABLES:
+        op.add_column(table, sa.Column('revision', sa.BigInteger(), nullable=False,
+                                       server_default=sa.text("nextval('revision_seq')")))
+        op.execute(f"""
+            CREATE TRIGGER {table}_bump_revision BEFORE UPDATE ON {table}
+                FOR EACH ROW EXECUTE PROCEDURE bump_revision();
+        """)
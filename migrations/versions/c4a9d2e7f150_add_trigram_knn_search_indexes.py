@@ -0,0 +1,40 @@
+"""add gist trigram indexes for nearest match search ordering
+
+Revision ID: c4a9d2e7f150
+Revises: b7e2f05c91d4
+Create Date: 2026-10-18 20:41:06.218734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a9d2e7f150'
+down_revision = 'b7e2f05c91d4'
+branch_labels = None
+depends_on = None
+
+# gist_trgm_ops indexes return rows nearest first for ORDER BY column <-> term,
+# so a search reads about as many index entries as it returns rows
+KNN_INDEXES = [
+    ('ix_venues_name_trgm_gist', 'venues', 'name'),
+    ('ix_venues_city_trgm_gist', 'venues', 'city'),
+    ('ix_venues_state_trgm_gist', 'venues', 'state'),
+    ('ix_artists_name_trgm_gist', 'artists', 'name'),
+    ('ix_artists_city_trgm_gist', 'artists', 'city'),
+    ('ix_artists_state_trgm_gist', 'artists', 'state'),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, column in KNN_INDEXES:
+            op.create_index(name, table, [column], unique=False, postgresql_using='gist',
+                            postgresql_ops={column: 'gist_trgm_ops'}, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, column in reversed(KNN_INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,135 @@
+"""add trigger maintained show, album and track counters
+
+Revision ID: f8a347d3491e
+Revises: 1a76c370a17b
+Create Date: 2026-10-18 11:41:09.270154
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f8a347d3491e'
+down_revision = '1a76c370a17b'
+branch_labels = None
+depends_on = None
+
+# Statement level triggers with transition tables, so a multi-row INSERT or
+# a bulk DELETE adjusts each counter once per statement instead of per row.
+# Upcoming counts are taken against LOCALTIMESTAMP at write time; shows that
+# start later move to the past through `flask counters roll-forward`.
+COUNTER_FUNCTIONS = """
+CREATE FUNCTION shows_upcoming_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE venues SET upcoming_show_count = upcoming_show_count - delta.n
+        FROM (SELECT venue_id, count(*) AS n FROM old_shows
+              WHERE start_time > LOCALTIMESTAMP GROUP BY venue_id) AS delta
+        WHERE venues.id = delta.venue_id;
+        UPDATE artists SET upcoming_show_count = upcoming_show_count - delta.n
+        FROM (SELECT artist_id, count(*) AS n FROM old_shows
+              WHERE start_time > LOCALTIMESTAMP GROUP BY artist_id) AS delta
+        WHERE artists.id = delta.artist_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE venues SET upcoming_show_count = upcoming_show_count + delta.n
+        FROM (SELECT venue_id, count(*) AS n FROM new_shows
+              WHERE start_time > LOCALTIMESTAMP GROUP BY venue_id) AS delta
+        WHERE venues.id = delta.venue_id;
+        UPDATE artists SET upcoming_show_count = upcoming_show_count + delta.n
+        FROM (SELECT artist_id, count(*) AS n FROM new_shows
+              WHERE start_time > LOCALTIMESTAMP GROUP BY artist_id) AS delta
+        WHERE artists.id = delta.artist_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION albums_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE artists SET album_count = album_count - delta.n
+        FROM (SELECT artist_id, count(*) AS n FROM old_albums GROUP BY artist_id) AS delta
+        WHERE artists.id = delta.artist_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE artists SET album_count = album_count + delta.n
+        FROM (SELECT artist_id, count(*) AS n FROM new_albums GROUP BY artist_id) AS delta
+        WHERE artists.id = delta.artist_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION songs_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE albums SET track_count = track_count - delta.n
+        FROM (SELECT album_id, count(*) AS n FROM old_songs GROUP BY album_id) AS delta
+        WHERE albums.id = delta.album_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE albums SET track_count = track_count + delta.n
+        FROM (SELECT album_id, count(*) AS n FROM new_songs GROUP BY album_id) AS delta
+        WHERE albums.id = delta.album_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+COUNTED_TABLES = [
+    ('shows', 'shows_upcoming_count'),
+    ('albums', 'albums_count'),
+    ('songs', 'songs_count'),
+]
+
+BACKFILL = """
+UPDATE venues SET upcoming_show_count = (
+    SELECT count(*) FROM shows WHERE shows.venue_id = venues.id AND shows.start_time > LOCALTIMESTAMP);
+UPDATE artists SET upcoming_show_count = (
+    SELECT count(*) FROM shows WHERE shows.artist_id = artists.id AND shows.start_time > LOCALTIMESTAMP);
+UPDATE artists SET album_count = (SELECT count(*) FROM albums WHERE albums.artist_id = artists.id);
+UPDATE albums SET track_count = (SELECT count(*) FROM songs WHERE songs.album_id = albums.id);
+"""
+
+
+def upgrade():
+    op.add_column('venues', sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('artists', sa.Column('upcoming_show_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('artists', sa.Column('album_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('albums', sa.Column('track_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_venues_upcoming_show_count', 'venues', ['upcoming_show_count'], unique=False)
+    op.create_index('ix_artists_upcoming_show_count', 'artists', ['upcoming_show_count'], unique=False)
+
+    op.execute(COUNTER_FUNCTIONS)
+    for table, function in COUNTED_TABLES:
+        op.execute(f"""
+            CREATE TRIGGER {table}_count_insert AFTER INSERT ON {table}
+                REFERENCING NEW TABLE AS new_{table}
+                FOR EACH STATEMENT EXECUTE PROCEDURE {function}();
+            CREATE TRIGGER {table}_count_update AFTER UPDATE ON {table}
+                REFERENCING OLD TABLE AS old_{table} NEW TABLE AS new_{table}
+                FOR EACH STATEMENT EXECUTE PROCEDURE {function}();
+            CREATE TRIGGER {table}_count_delete AFTER DELETE ON {table}
+                REFERENCING OLD TABLE AS old_{table}
+                FOR EACH STATEMENT EXECUTE PROCEDURE {function}();
+        """)
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    for table, function in reversed(COUNTED_TABLES):
+        op.execute(f"""
+            DROP TRIGGER {table}_count_delete ON {table};
+            DROP TRIGGER {table}_count_update ON {table};
+            DROP TRIGGER {table}_count_insert ON {table};
+            DROP FUNCTION {function}();
+        """)
+    op.drop_index('ix_artists_upcoming_show_count', table_name='artists')
+    op.drop_index('ix_venues_upcoming_show_count', table_name='venues')
+    op.drop_column('albums', 'track_count')
+    op.drop_column('artists', 'album_count')
+    op.drop_column('artists', 'upcoming_show_count')
+    op.drop_column('venues', 'upcoming_show_count')
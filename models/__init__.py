@@ -1,8 +1,41 @@
-from datetime import datetime
+from flask_sqlalchemy import BaseQuery, SQLAlchemy
+from sqlalchemy.dialects.postgresql import ExcludeConstraint
 
-from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+class ProfiledQuery(BaseQuery):
+    """Query with named relationship loading profiles.
+
+    Relationships are lazy by default; a route states what it needs with
+    e.g. ``Artist.query.profile('detail').get_or_404(artist_id)``.
+    """
+
+    def profile(self, name):
+        model = self.column_descriptions[0]['entity']
+        try:
+            options = LOADING_PROFILES[model][name]
+        except KeyError:
+            raise ValueError(f'Unknown loading profile {name!r} for {model.__name__}')
+        return self.options(*options())
+
+
+db = SQLAlchemy(query_class=ProfiledQuery)
+
+# shared by the version columns, drawn again by triggers
+revision_seq = db.Sequence('revision_seq', metadata=db.metadata)
+
+
+# upcoming show counters hold the shows starting after rolled_at, see models.counters
+counter_state = db.Table(
+    'counter_state', db.metadata,
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('rolled_at', db.DateTime, nullable=False),
+    db.CheckConstraint('id = 1', name='ck_counter_state_single_row'),
+)
+
+
+def version_column():
+    return db.Column(db.BigInteger, nullable=False, server_default=revision_seq.next_value(),
+                     server_onupdate=db.FetchedValue())
 
 
 # ----------------------------------------------------------------------------#
@@ -11,6 +44,16 @@ db = SQLAlchemy()
 
 class Venue(db.Model):
     __tablename__ = 'venues'
+    __table_args__ = (
+        db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_venues_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_venues_state_trgm', 'state', postgresql_using='gin', postgresql_ops={'state': 'gin_trgm_ops'}),
+        db.Index('ix_venues_name_trgm_gist', 'name', postgresql_using='gist', postgresql_ops={'name': 'gist_trgm_ops'}),
+        db.Index('ix_venues_city_trgm_gist', 'city', postgresql_using='gist', postgresql_ops={'city': 'gist_trgm_ops'}),
+        db.Index('ix_venues_state_trgm_gist', 'state', postgresql_using='gist', postgresql_ops={'state': 'gist_trgm_ops'}),
+        db.Index('ix_venues_upcoming_show_count', 'upcoming_show_count'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -24,30 +67,32 @@ class Venue(db.Model):
     website_link = db.Column(db.String(120))
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(120))
-    shows = db.relationship('Show', backref='venues', lazy='joined', cascade='all, delete-orphan')
+    # maintained by database triggers, see models.counters
+    upcoming_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    # changes whenever its page does, see models.versions
+    version = version_column()
+    shows = db.relationship('Show', backref='venues', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Artist id : {self.id} {self.name} >'
 
-    @property
-    def past_shows(self):
-        return [show for show in self.shows if show.start_time < datetime.now()]
-
-    @property
-    def upcoming_shows(self):
-        return [show for show in self.shows if show.start_time > datetime.now()]
-
-    @property
-    def num_past_shows(self):
-        return len(self.past_shows)
-
     @property
     def num_upcoming_shows(self):
-        return len(self.upcoming_shows)
+        return self.upcoming_show_count
 
 
 class Artist(db.Model):
     __tablename__ = 'artists'
+    __table_args__ = (
+        db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_artists_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_artists_state_trgm', 'state', postgresql_using='gin', postgresql_ops={'state': 'gin_trgm_ops'}),
+        db.Index('ix_artists_name_trgm_gist', 'name', postgresql_using='gist', postgresql_ops={'name': 'gist_trgm_ops'}),
+        db.Index('ix_artists_city_trgm_gist', 'city', postgresql_using='gist', postgresql_ops={'city': 'gist_trgm_ops'}),
+        db.Index('ix_artists_state_trgm_gist', 'state', postgresql_using='gist', postgresql_ops={'state': 'gist_trgm_ops'}),
+        db.Index('ix_artists_upcoming_show_count', 'upcoming_show_count'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String)
@@ -60,15 +105,24 @@ class Artist(db.Model):
     website_link = db.Column(db.String(120))
     seeking_venue = db.Column(db.Boolean)
     seeking_description = db.Column(db.String(120))
+    # maintained by database triggers, see models.counters
+    upcoming_show_count = db.Column(db.Integer, nullable=False, server_default='0')
+    album_count = db.Column(db.Integer, nullable=False, server_default='0')
+    # changes whenever its page does, see models.versions
+    version = version_column()
     shows = db.relationship('Show', backref='artists', lazy=True, cascade='all, delete-orphan')
-    albums = db.relationship('Album', backref='artists', lazy='joined', cascade='all, delete-orphan')
+    albums = db.relationship('Album', backref='artist', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Artist id : {self.id} {self.name} >'
 
+    @property
+    def num_upcoming_shows(self):
+        return self.upcoming_show_count
+
     @property
     def total_albums(self):
-        return len(self.albums)
+        return self.album_count
 
     @property
     def latest_released_album(self):
@@ -77,46 +131,96 @@ class Artist(db.Model):
 
 class Show(db.Model):
     __tablename__ = 'shows'
+    __table_args__ = (
+        db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+        db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+        db.CheckConstraint('end_time >= start_time', name='ck_shows_end_time'),
+        # a venue hosts and an artist plays one show at a time, see models.schedule
+        ExcludeConstraint(('venue_id', '='), (db.text('tsrange(start_time, end_time)'), '&&'),
+                          name='ex_shows_venue_booking', using='gist'),
+        ExcludeConstraint(('artist_id', '='), (db.text('tsrange(start_time, end_time)'), '&&'),
+                          name='ex_shows_artist_booking', using='gist'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     venue_id = db.Column(db.Integer, db.ForeignKey('venues.id'), nullable=False)
     artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
     start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
 
     def __repr__(self):
         return f'<Show id : {self.id} artist_id : {self.artist_id} venue_id : {self.venue_id} start_time : {self.start_time}>'
 
+    @property
+    def duration(self):
+        return self.end_time - self.start_time
+
 
 class Album(db.Model):
     __tablename__ = 'albums'
 
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('artists.id'), nullable=False, index=True)
     name = db.Column(db.String)
     release_date = db.Column(db.DateTime, nullable=False)
     image_link = db.Column(db.String(500))
-    songs = db.relationship('Song', backref='albums', lazy='joined', cascade='all, delete-orphan')
+    # maintained by database triggers, see models.counters
+    track_count = db.Column(db.Integer, nullable=False, server_default='0')
+    # changes whenever its page does, see models.versions
+    version = version_column()
+    songs = db.relationship('Song', backref='album', lazy=True, order_by='Song.position',
+                            cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Album id : {self.id} artist_id : {self.artist_id} name : {self.name}>'
 
     @property
     def total_tracks(self):
-        return len(self.songs)
+        return self.track_count
 
 
 class Song(db.Model):
     __tablename__ = 'songs'
+    __table_args__ = (
+        db.Index('ix_songs_album_id_position', 'album_id', 'position'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    album_id = db.Column(db.Integer, db.ForeignKey('albums.id'), nullable=False)
+    album_id = db.Column(db.Integer, db.ForeignKey('albums.id'), nullable=False, index=True)
     name = db.Column(db.String)
     duration = db.Column(db.Integer, nullable=False)
+    # 1-based place of the song in its album, see models.tracklist
+    position = db.Column(db.Integer, nullable=False)
 
     def __repr__(self):
-        return f'<Song id : {self.id} album_id : {self.album_id} title : {self.title}>'
+        return f'<Song id : {self.id} album_id : {self.album_id} name : {self.name}>'
 
     @property
     def track_number(self):
-        return self.album.songs.index(self) + 1
+        return self.position
+
+
+# ----------------------------------------------------------------------------#
+# Loading profiles.
+# ----------------------------------------------------------------------------#
 
+# relationships to load with the entity, per model and per kind of page
+LOADING_PROFILES = {
+    Venue: {
+        # shows are read through the timeline queries, never the collection
+        'listing': lambda: (db.lazyload(Venue.shows),),
+        'detail': lambda: (db.lazyload(Venue.shows),),
+        'edit': lambda: (db.lazyload(Venue.shows),),
+    },
+    Artist: {
+        'listing': lambda: (db.lazyload(Artist.albums), db.lazyload(Artist.shows)),
+        'detail': lambda: (db.selectinload(Artist.albums), db.lazyload(Artist.shows)),
+        'edit': lambda: (db.lazyload(Artist.albums), db.lazyload(Artist.shows)),
+    },
+    Album: {
+        'listing': lambda: (db.lazyload(Album.songs),),
+        'detail': lambda: (db.joinedload(Album.artist), db.selectinload(Album.songs)),
+        'edit': lambda: (db.lazyload(Album.songs),),
+    },
+}
@@ -0,0 +1,73 @@
+# ----------------------------------------------------------------------------#
+# Counters : upcoming_show_count, album_count and track_count.
+#
+# Database triggers (see the f8a347d3491e and 9d41c6b2e8f3 migrations) keep
+# the counters right on every insert, update and delete. An upcoming count
+# holds the shows starting after counter_state.rolled_at, the watermark, and
+# the triggers add and subtract against it, so deleting or moving a show that
+# has started since is subtracted exactly as it was counted. Time passing is
+# the only thing they cannot see : roll_forward() has to run periodically,
+# `flask counters roll-forward` from cron (see the README), to move the
+# watermark to now and the shows that started in between to past.
+# Upcoming is always taken against the database clock (LOCALTIMESTAMP).
+# ----------------------------------------------------------------------------#
+from models import db
+
+# show writers wait for the roll forward, so that no trigger counts against
+# the watermark being moved; readers are not blocked
+LOCK_SHOWS = 'LOCK TABLE shows IN SHARE ROW EXCLUSIVE MODE'
+
+ADVANCE_WATERMARK = """
+UPDATE counter_state SET rolled_at = LOCALTIMESTAMP
+FROM (SELECT rolled_at FROM counter_state WHERE id = 1) AS previous
+WHERE counter_state.id = 1
+RETURNING previous.rolled_at AS since, counter_state.rolled_at AS until
+"""
+
+# subtract the shows that started between the two watermarks
+ROLL_FORWARD = """
+UPDATE {table} SET upcoming_show_count = upcoming_show_count - started.n
+FROM (
+    SELECT {column}, count(*) AS n FROM shows
+    WHERE shows.start_time > :since AND shows.start_time <= :until
+    GROUP BY {column}
+) AS started
+WHERE {table}.id = started.{column}
+"""
+
+REBUILD = [
+    """UPDATE venues SET upcoming_show_count = (
+        SELECT count(*) FROM shows WHERE shows.venue_id = venues.id
+        AND shows.start_time > (SELECT rolled_at FROM counter_state WHERE id = 1))""",
+    """UPDATE artists SET upcoming_show_count = (
+        SELECT count(*) FROM shows WHERE shows.artist_id = artists.id
+        AND shows.start_time > (SELECT rolled_at FROM counter_state WHERE id = 1))""",
+    """UPDATE artists SET album_count = (SELECT count(*) FROM albums WHERE albums.artist_id = artists.id)""",
+    """UPDATE albums SET track_count = (SELECT count(*) FROM songs WHERE songs.album_id = albums.id)""",
+]
+
+
+def roll_forward():
+    """Move the watermark to now and the shows started since the last run to past.
+
+    Exact however long ago the last run was; run it every few minutes.
+    Returns the number of venues and artists updated.
+    """
+    db.session.execute(LOCK_SHOWS)
+    window = db.session.execute(ADVANCE_WATERMARK).first()
+    updated = 0
+    for table, column in (('venues', 'venue_id'), ('artists', 'artist_id')):
+        result = db.session.execute(ROLL_FORWARD.format(table=table, column=column),
+                                    {'since': window.since, 'until': window.until})
+        updated += result.rowcount
+    db.session.commit()
+    return updated
+
+
+def rebuild_counters():
+    # recompute every counter from scratch, against a watermark moved to now
+    db.session.execute(LOCK_SHOWS)
+    db.session.execute(ADVANCE_WATERMARK)
+    for statement in REBUILD:
+        db.session.execute(statement)
+    db.session.commit()
@@ -0,0 +1,110 @@
+# ----------------------------------------------------------------------------#
+# Schedule : show end times and double booking checks.
+#
+# The ex_shows_*_booking exclusion constraints have the final word; these
+# checks run first to tell the user which show is in the way, and to
+# validate a whole batch of new shows at once : against each other with a
+# sweep over each venue's and artist's shows in start order, and against
+# the stored shows with one query served by the constraints' gist indexes.
+# ----------------------------------------------------------------------------#
+from collections import defaultdict
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+
+BOOKING_CONSTRAINTS = ('ex_shows_venue_booking', 'ex_shows_artist_booking')
+
+STORED_CONFLICTS = """
+SELECT candidates.index - 1, 'venue', shows.id, shows.start_time, shows.end_time
+FROM unnest(CAST(:venue_ids AS integer[]), CAST(:starts AS timestamp[]), CAST(:ends AS timestamp[]))
+     WITH ORDINALITY AS candidates(venue_id, start_time, end_time, index)
+JOIN shows ON shows.venue_id = candidates.venue_id
+          AND tsrange(shows.start_time, shows.end_time) && tsrange(candidates.start_time, candidates.end_time)
+UNION ALL
+SELECT candidates.index - 1, 'artist', shows.id, shows.start_time, shows.end_time
+FROM unnest(CAST(:artist_ids AS integer[]), CAST(:starts AS timestamp[]), CAST(:ends AS timestamp[]))
+     WITH ORDINALITY AS candidates(artist_id, start_time, end_time, index)
+JOIN shows ON shows.artist_id = candidates.artist_id
+          AND tsrange(shows.start_time, shows.end_time) && tsrange(candidates.start_time, candidates.end_time)
+"""
+
+MESSAGES = {
+    'venue': 'The venue is already booked from {start} to {end} ({show}).',
+    'artist': 'The artist is already playing from {start} to {end} ({show}).',
+}
+
+
+def with_end_time(show):
+    # shows without an end time last SHOW_DEFAULT_DURATION minutes
+    if show.get('end_time') is None:
+        show = dict(show, end_time=show['start_time'] + timedelta(minutes=current_app.config['SHOW_DEFAULT_DURATION']))
+    return show
+
+
+def expand_shows(show, occurrences=None, tour=()):
+    """Every show of a residency or a tour : ``show`` at each of its recurrence
+    ``occurrences`` (or just once), then at each (venue_id, start_time) tour stop,
+    all lasting as long as ``show``.
+    """
+    duration = show['end_time'] - show['start_time']
+    starts = [(show['venue_id'], start_time) for start_time in occurrences or [show['start_time']]]
+    return [
+        dict(show, venue_id=venue_id, start_time=start_time, end_time=start_time + duration)
+        for venue_id, start_time in starts + list(tour)
+    ]
+
+
+def find_conflicts(shows):
+    """Double bookings among ``shows`` (dicts with venue_id, artist_id, start_time and
+    end_time) and between them and the stored shows.
+
+    Returns {index of the show in ``shows``: [messages]}.
+    """
+    conflicts = defaultdict(list)
+    if not shows:
+        return conflicts
+
+    for kind in MESSAGES:
+        for index, other in overlapping(shows, f'{kind}_id'):
+            conflicts[index].append(MESSAGES[kind].format(
+                start=shows[other]['start_time'], end=shows[other]['end_time'], show='another new show'))
+
+    stored = db.session.execute(STORED_CONFLICTS, {
+        'venue_ids': [show['venue_id'] for show in shows],
+        'artist_ids': [show['artist_id'] for show in shows],
+        'starts': [show['start_time'] for show in shows],
+        'ends': [show['end_time'] for show in shows],
+    })
+    for index, kind, id, start_time, end_time in stored:
+        conflicts[index].append(MESSAGES[kind].format(start=start_time, end=end_time, show=f'show {id}'))
+    return conflicts
+
+
+def overlapping(shows, key):
+    # (index, index of an earlier show it overlaps) for shows sharing the same key
+    groups = defaultdict(list)
+    for index, show in enumerate(shows):
+        groups[show[key]].append(index)
+
+    for indexes in groups.values():
+        indexes.sort(key=lambda index: shows[index]['start_time'])
+        # the show ending last so far, any overlap includes it
+        latest = None
+        for index in indexes:
+            show = shows[index]
+            if show['start_time'] == show['end_time']:
+                # an empty range overlaps nothing
+                continue
+            if latest is not None and show['start_time'] < shows[latest]['end_time']:
+                yield index, latest
+            if latest is None or show['end_time'] > shows[latest]['end_time']:
+                latest = index
+
+
+def is_double_booking(error):
+    # an insert refused by one of the exclusion constraints
+    diag = getattr(getattr(error, 'orig', None), 'diag', None)
+    return isinstance(error, IntegrityError) and getattr(diag, 'constraint_name', None) in BOOKING_CONSTRAINTS
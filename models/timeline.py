@@ -0,0 +1,82 @@
+# ----------------------------------------------------------------------------#
+# Show timeline : past and upcoming shows of a venue or an artist.
+# ----------------------------------------------------------------------------#
+from collections import namedtuple
+
+from models import db, Artist, Show, Venue
+
+Timeline = namedtuple('Timeline', 'upcoming_shows upcoming_shows_count past_shows past_shows_count')
+
+
+def venue_timeline(venue_id, per_page, upcoming_page=1, past_page=1, now=None):
+    # shows at a venue, with the performing artist's name and image
+    return show_timeline(
+        Show.venue_id == venue_id,
+        Artist,
+        Show.artist_id,
+        (Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link')),
+        per_page, upcoming_page, past_page, now
+    )
+
+
+def artist_timeline(artist_id, per_page, upcoming_page=1, past_page=1, now=None):
+    # shows of an artist, with the hosting venue's name and image
+    return show_timeline(
+        Show.artist_id == artist_id,
+        Venue,
+        Show.venue_id,
+        (Venue.name.label('venue_name'), Venue.image_link.label('venue_image_link')),
+        per_page, upcoming_page, past_page, now
+    )
+
+
+def show_timeline(criterion, partner, partner_column, partner_columns, per_page, upcoming_page, past_page, now):
+    """Fetch one page of upcoming and one page of past shows in a single query.
+
+    A single ``now``, the database clock unless given, splits the shows, so a
+    show starting exactly at the boundary is past rather than missing from
+    both lists. Upcoming shows come soonest first, past shows most recent
+    first, and each side is paged on its own through a row_number() window.
+    """
+    now = now if now is not None else db.func.localtimestamp()
+    is_upcoming = Show.start_time > now
+
+    shows = db.session.query(
+        Show.id,
+        Show.venue_id,
+        Show.artist_id,
+        Show.start_time,
+        *partner_columns,
+        is_upcoming.label('upcoming'),
+        db.func.row_number().over(
+            partition_by=is_upcoming,
+            order_by=(db.case([(is_upcoming, Show.start_time)]), Show.start_time.desc())
+        ).label('position'),
+        db.func.count().over(partition_by=is_upcoming).label('total')
+    ).join(partner, partner.id == partner_column).filter(criterion).subquery()
+
+    upcoming_pages = (upcoming_page - 1) * per_page + 1, upcoming_page * per_page
+    past_pages = (past_page - 1) * per_page + 1, past_page * per_page
+
+    # the first show of each side always comes back too, to carry the side's total
+    rows = db.session.query(shows).filter(db.or_(
+        shows.c.position == 1,
+        db.and_(shows.c.upcoming, shows.c.position.between(*upcoming_pages)),
+        db.and_(db.not_(shows.c.upcoming), shows.c.position.between(*past_pages))
+    )).order_by(shows.c.upcoming.desc(), shows.c.position).all()
+
+    upcoming_shows = []
+    past_shows = []
+    totals = {True: 0, False: 0}
+    for row in rows:
+        totals[row.upcoming] = row.total
+        first, last = upcoming_pages if row.upcoming else past_pages
+        if first <= row.position <= last:
+            (upcoming_shows if row.upcoming else past_shows).append(row)
+
+    return Timeline(
+        upcoming_shows=upcoming_shows,
+        upcoming_shows_count=totals[True],
+        past_shows=past_shows,
+        past_shows_count=totals[False]
+    )
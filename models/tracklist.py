@@ -0,0 +1,72 @@
+# ----------------------------------------------------------------------------#
+# Tracklist : song positions within an album.
+#
+# Positions are 1-based and contiguous. Every operation renumbers the
+# affected songs with a single UPDATE instead of touching them one by one,
+# and locks the album row first so concurrent edits of a tracklist queue up.
+# ----------------------------------------------------------------------------#
+from models import db, Album, Song
+
+
+def lock_album(album_id):
+    db.session.query(Album.id).filter(Album.id == album_id).with_for_update().first()
+
+
+def insert_songs(album_id, songs, position=None):
+    """Add ``songs`` to an album, in order, starting at ``position``.
+
+    Songs already at or after ``position`` move down in one UPDATE. Without
+    a position, or past the last track, the songs are appended. Does not
+    commit.
+    """
+    songs = list(songs)
+    lock_album(album_id)
+    end = db.session.query(db.func.coalesce(db.func.max(Song.position), 0) + 1).filter(
+        Song.album_id == album_id).scalar()
+    # keep the positions contiguous : no gap after the last track
+    first = end if position is None else min(max(position, 1), end)
+    if first < end:
+        Song.query.filter(Song.album_id == album_id, Song.position >= first).update(
+            {Song.position: Song.position + len(songs)}, synchronize_session=False)
+
+    for offset, song in enumerate(songs):
+        song.album_id = album_id
+        song.position = first + offset
+    db.session.add_all(songs)
+    return songs
+
+
+def reorder_songs(album_id, song_ids):
+    """Renumber an album's songs in the order of ``song_ids``, in one UPDATE.
+
+    ``song_ids`` must list every song of the album exactly once, otherwise a
+    ValueError is raised. Does not commit.
+    """
+    song_ids = [int(song_id) for song_id in song_ids]
+    lock_album(album_id)
+    current = {song_id for song_id, in Song.query.with_entities(Song.id).filter(Song.album_id == album_id)}
+    if len(song_ids) != len(current) or set(song_ids) != current:
+        raise ValueError('song_ids must list every song of the album exactly once')
+
+    db.session.execute(
+        '''UPDATE songs SET position = ordered.position
+           FROM unnest(CAST(:song_ids AS integer[])) WITH ORDINALITY AS ordered(id, position)
+           WHERE songs.id = ordered.id AND songs.album_id = :album_id''',
+        {'song_ids': song_ids, 'album_id': album_id}
+    )
+
+
+def remove_songs(album_id, song_ids):
+    """Delete songs from an album and close the gaps they leave, in one UPDATE.
+
+    Does not commit.
+    """
+    lock_album(album_id)
+    Song.query.filter(Song.album_id == album_id, Song.id.in_(song_ids)).delete(synchronize_session=False)
+    db.session.execute(
+        '''UPDATE songs SET position = numbered.position
+           FROM (SELECT id, row_number() OVER (ORDER BY position) AS position
+                 FROM songs WHERE album_id = :album_id) AS numbered
+           WHERE songs.id = numbered.id AND songs.position <> numbered.position''',
+        {'album_id': album_id}
+    )
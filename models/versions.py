@@ -0,0 +1,55 @@
+# ----------------------------------------------------------------------------#
+# Versions : strong etags for the venue, artist and album pages.
+#
+# Venues, artists and albums carry a version that database triggers (see the
+# b7e2f05c91d4 migration) draw again from revision_seq whenever the row or
+# anything its page displays is inserted, updated or deleted. Numbers only
+# grow, so a version never comes back even when transactions commit out of
+# order. Reading one is a primary key lookup. Venue and artist pages also
+# split shows into past and upcoming as time passes, so their etag includes
+# the start of the next upcoming show, one probe of the (venue_id, start_time)
+# or (artist_id, start_time) index.
+# ----------------------------------------------------------------------------#
+import hashlib
+
+from models import db
+
+VENUE_VERSION = """
+SELECT venues.version,
+       (SELECT min(shows.start_time) FROM shows
+        WHERE shows.venue_id = venues.id AND shows.start_time > LOCALTIMESTAMP)
+FROM venues
+WHERE venues.id = :id
+"""
+
+ARTIST_VERSION = """
+SELECT artists.version,
+       (SELECT min(shows.start_time) FROM shows
+        WHERE shows.artist_id = artists.id AND shows.start_time > LOCALTIMESTAMP)
+FROM artists
+WHERE artists.id = :id
+"""
+
+ALBUM_VERSION = """
+SELECT albums.version FROM albums WHERE albums.id = :id
+"""
+
+
+def venue_etag(venue_id):
+    return entity_etag('venue', VENUE_VERSION, venue_id)
+
+
+def artist_etag(artist_id):
+    return entity_etag('artist', ARTIST_VERSION, artist_id)
+
+
+def album_etag(album_id):
+    return entity_etag('album', ALBUM_VERSION, album_id)
+
+
+def entity_etag(kind, statement, id):
+    # None when the entity does not exist
+    version = db.session.execute(statement, {'id': id}).first()
+    if version is None:
+        return None
+    return hashlib.sha1(f'{kind}:{id}:{tuple(version)}'.encode()).hexdigest()
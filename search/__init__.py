@@ -0,0 +1,87 @@
+# ----------------------------------------------------------------------------#
+# Search : venues and artists by name, city and state.
+# ----------------------------------------------------------------------------#
+import shlex
+from collections import namedtuple
+
+from models import db
+
+SEARCH_FIELDS = ('name', 'city', 'state')
+
+SearchQuery = namedtuple('SearchQuery', SEARCH_FIELDS)
+
+
+def parse_search_term(search_term):
+    """Parse a free-text search term into a SearchQuery.
+
+    Comma separated parts read as "name", "city, state" or
+    "name, city, state". Explicit field:value tokens (quoted when they
+    contain spaces, e.g. city:"San Francisco") take precedence.
+    """
+    try:
+        tokens = shlex.split(search_term)
+    except ValueError:
+        # unbalanced quotes, fall back to plain whitespace splitting
+        tokens = search_term.split()
+
+    fields = {}
+    words = []
+    for token in tokens:
+        field, sep, value = token.partition(':')
+        if sep and field.lower() in SEARCH_FIELDS:
+            fields[field.lower()] = value.strip()
+        else:
+            words.append(token)
+
+    parts = [part.strip() for part in ' '.join(words).split(',') if part.strip()]
+    if len(parts) == 1:
+        fields.setdefault('name', parts[0])
+    elif len(parts) >= 2:
+        fields.setdefault('state', parts[-1])
+        fields.setdefault('city', parts[-2])
+        if len(parts) > 2:
+            fields.setdefault('name', ', '.join(parts[:-2]))
+
+    return SearchQuery(*(fields.get(field) or None for field in SEARCH_FIELDS))
+
+
+def search_catalog(model, search_term, limit, count_limit=1000):
+    """Search venues or artists, nearest trigram match first.
+
+    Returns the number of matches, counted up to ``count_limit`` + 1, and up
+    to ``limit`` rows of (id, name, num_upcoming_shows). Rows are ranked on
+    the first field searched (name, else city, else state) by trigram
+    distance, which the gist_trgm_ops indexes return in order : neither the
+    ranking nor the count reads every match of a common term.
+    """
+    query = parse_search_term(search_term)
+
+    filters = []
+    ordering = []
+    for field in SEARCH_FIELDS:
+        value = getattr(query, field)
+        if value:
+            column = getattr(model, field)
+            filters.append(column.ilike('%' + escape_like(value) + '%', escape='\\'))
+            if not ordering:
+                ordering.append(column.op('<->')(value))
+
+    matches = db.session.query(model.id).filter(*filters).limit(count_limit + 1).subquery()
+    total = db.session.query(db.func.count()).select_from(matches).as_scalar()
+    rows = model.query.with_entities(
+        model.id,
+        model.name,
+        model.upcoming_show_count.label('num_upcoming_shows'),
+        total.label('total')
+    ).filter(*filters).order_by(*ordering, model.name, model.id).limit(limit).all()
+
+    return (rows[0].total if rows else 0), rows
+
+
+def count_label(count, count_limit):
+    # "1000+" once the count stopped at its limit
+    return f'{count_limit}+' if count > count_limit else count
+
+
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
@@ -0,0 +1,160 @@
+# ----------------------------------------------------------------------------#
+# Autocomplete : in-memory prefix index of artist and venue names.
+# ----------------------------------------------------------------------------#
+import logging
+import threading
+from bisect import bisect_left, insort
+
+from models import Artist, Venue
+
+logger = logging.getLogger(__name__)
+
+# seconds a completion waits for the first build before answering from what there is
+BUILD_WAIT = 5
+
+AUTOCOMPLETE_MODELS = {
+    'artist': Artist,
+    'venue': Venue,
+}
+
+
+class AutocompleteIndex:
+    """Sorted array of lowercased name keys, searched with bisect.
+
+    Every word of a name is indexed, so "note" completes "Blue Note".
+    With an app, a background thread builds the index from the database when
+    the process starts serving and rebuilds it every ``max_age`` seconds,
+    which bounds how stale it can get when another worker process handled
+    the write; requests only read it. The write routes keep it current in
+    between, and their changes made during a rebuild are applied again on
+    the new index. After a bulk write, refresh() has the thread rebuild now.
+    """
+
+    def __init__(self, app=None, max_age=300):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # one rebuild at a time
+        self._build_lock = threading.Lock()
+        self._built = threading.Event()
+        self._wake = threading.Event()
+        self._pending = None
+        self._keys = []
+        self._names = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # a thread per worker process, started once it serves (threads do not survive a fork)
+        app.before_first_request(lambda: self.start(app))
+        app.extensions['autocomplete_index'] = self
+
+    def start(self, app):
+        thread = threading.Thread(target=self._refresh, args=(app,), daemon=True)
+        thread.start()
+
+    def refresh(self):
+        # rebuild in the background thread without waiting for max_age
+        self._wake.set()
+
+    def add(self, kind, id, name):
+        self._write(kind, id, name)
+
+    def update(self, kind, id, name):
+        self._write(kind, id, name)
+
+    def remove(self, kind, id):
+        self._write(kind, id, None)
+
+    def complete(self, prefix, kind=None, limit=10):
+        # right after start up, give the first build a moment
+        self._built.wait(BUILD_WAIT)
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        with self._lock:
+            keys = self._keys
+            position = bisect_left(keys, (prefix,))
+            while position < len(keys) and len(results) < limit:
+                key, entry_kind, entry_id = keys[position]
+                if not key.startswith(prefix):
+                    break
+                position += 1
+                if (kind and entry_kind != kind) or (entry_kind, entry_id) in seen:
+                    continue
+                seen.add((entry_kind, entry_id))
+                results.append({'type': entry_kind, 'id': entry_id, 'name': self._names[(entry_kind, entry_id)]})
+        return results
+
+    def build(self):
+        # needs an app context
+        with self._build_lock:
+            with self._lock:
+                self._pending = []
+            try:
+                keys = []
+                names = {}
+                for kind, model in AUTOCOMPLETE_MODELS.items():
+                    for id, name in model.query.with_entities(model.id, model.name):
+                        if name and name.strip():
+                            names[(kind, id)] = name
+                            keys.extend((word, kind, id) for word in name_keys(name))
+                keys.sort()
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            with self._lock:
+                self._keys = keys
+                self._names = names
+                # writes that came in while the database was read
+                for kind, id, name in self._pending:
+                    self._set(kind, id, name)
+                self._pending = None
+
+    def _refresh(self, app):
+        while True:
+            try:
+                with app.app_context():
+                    self.build()
+            except Exception:
+                logger.exception('Autocomplete index build failed')
+            # the first attempt is over, completions stop waiting for it
+            self._built.set()
+            self._wake.wait(self.max_age)
+            self._wake.clear()
+
+    def _write(self, kind, id, name):
+        with self._lock:
+            self._set(kind, id, name)
+            if self._pending is not None:
+                self._pending.append((kind, id, name))
+
+    def _set(self, kind, id, name):
+        # the name of an entry, None to remove it; applying it twice changes nothing
+        self._remove(kind, id)
+        self._add(kind, id, name)
+
+    def _add(self, kind, id, name):
+        if not name or not name.strip():
+            return
+        self._names[(kind, id)] = name
+        for key in name_keys(name):
+            insort(self._keys, (key, kind, id))
+
+    def _remove(self, kind, id):
+        name = self._names.pop((kind, id), None)
+        if name is None:
+            return
+        for key in name_keys(name):
+            position = bisect_left(self._keys, (key, kind, id))
+            if position < len(self._keys) and self._keys[position] == (key, kind, id):
+                del self._keys[position]
+
+
+def name_keys(name):
+    # the whole name, then the name from each following word onwards
+    words = name.lower().split()
+    return {' '.join(words[i:]) for i in range(len(words))}
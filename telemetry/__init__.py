@@ -0,0 +1,3 @@
+# ----------------------------------------------------------------------------#
+# Telemetry : what a request costs, measured inside the app.
+# ----------------------------------------------------------------------------#
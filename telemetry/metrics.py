@@ -0,0 +1,221 @@
+# ----------------------------------------------------------------------------#
+# Metrics : Prometheus text exposition of route latency, in-flight requests,
+# database pool, template rendering, errors and response cache, at /metrics.
+#
+# Values live in the process serving the scrape; with several workers each
+# one reports its own, scrape them individually or sum them.
+# ----------------------------------------------------------------------------#
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, current_app, g, request
+from jinja2 import Template
+from sqlalchemy.pool import QueuePool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] += amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, dict(zip(self.labels, labels)), value)
+                    for labels, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels):
+        self.inc(*labels, amount=-1)
+
+
+class Histogram(Counter):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # labels -> cumulative count per bucket, then count and sum
+        self.values = defaultdict(lambda: [0] * (len(buckets) + 2))
+
+    def observe(self, seconds, *labels):
+        with self.lock:
+            values = self.values[labels]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    values[index] += 1
+            values[-2] += 1
+            values[-1] += seconds
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for labels, values in sorted(self.values.items()):
+                labels = dict(zip(self.labels, labels))
+                for bound, count in zip(self.buckets + ('+Inf',), values[:-2] + [values[-2]]):
+                    samples.append((f'{self.name}_bucket', {**labels, 'le': bound}, count))
+                samples.append((f'{self.name}_count', labels, values[-2]))
+                samples.append((f'{self.name}_sum', labels, values[-1]))
+        return samples
+
+
+request_duration = Histogram('fyyur_request_duration_seconds',
+                             'Time spent handling requests, streamed bodies included.',
+                             ('endpoint', 'method', 'status'))
+requests_in_flight = Gauge('fyyur_requests_in_flight', 'Requests being handled.')
+request_errors = Counter('fyyur_request_errors_total', 'Responses with a 4xx or 5xx status, per handler.',
+                         ('endpoint', 'status'))
+db_queries = Counter('fyyur_db_queries_total', 'SQL statements run, per handler.', ('endpoint',))
+db_seconds = Counter('fyyur_db_query_seconds_total', 'Time spent in SQL statements, per handler.', ('endpoint',))
+pool_checkout_wait = Histogram('fyyur_db_pool_checkout_seconds',
+                               'Time to get a connection from the pool, waits and new connections included.')
+template_render = Histogram('fyyur_template_render_seconds',
+                            'Template rendering time; streamed templates include fetching their rows.',
+                            ('template',))
+
+METRICS = (request_duration, requests_in_flight, request_errors, db_queries, db_seconds,
+           pool_checkout_wait, template_render)
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool timing every connection checkout."""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+class TimedTemplate(Template):
+    """Jinja template timing render() and the streaming generate()."""
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            template_render.observe(time.perf_counter() - started, self.name)
+
+    def generate(self, *args, **kwargs):
+        # only the time spent inside the template, not the time the client takes to read
+        chunks = super().generate(*args, **kwargs)
+        seconds = 0
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    return
+                finally:
+                    seconds += time.perf_counter() - started
+                yield chunk
+        finally:
+            template_render.observe(seconds, self.name)
+
+
+class Metrics:
+    """Flask extension collecting request metrics and serving /metrics."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # set before the engine and the first template are created
+        app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {}).setdefault('poolclass', TimedQueuePool)
+        app.jinja_env.template_class = TimedTemplate
+
+        app.before_request(self.start)
+        app.after_request(self.record_status)
+        app.teardown_request(self.finish)
+        app.add_url_rule('/metrics', 'metrics', self.expose)
+        app.extensions['metrics'] = self
+
+    def start(self):
+        g.metrics_started = time.perf_counter()
+        requests_in_flight.inc()
+
+    def record_status(self, response):
+        g.metrics_status = response.status_code
+        return response
+
+    def finish(self, exception=None):
+        # at teardown, after a streamed body has been sent
+        if 'metrics_started' not in g:
+            return
+        requests_in_flight.dec()
+        endpoint = request.endpoint or 'unmatched'
+        status = g.get('metrics_status', 500)
+        request_duration.observe(time.perf_counter() - g.metrics_started, endpoint, request.method, str(status))
+        if status >= 400:
+            request_errors.inc(endpoint, str(status))
+        queries = g.get('sql_queries')
+        if queries is not None:
+            db_queries.inc(endpoint, amount=queries.count)
+            db_seconds.inc(endpoint, amount=queries.seconds)
+
+    def expose(self):
+        lines = []
+        for metric in METRICS:
+            lines += exposition(metric.name, metric.kind, metric.help, metric.samples())
+        for name, help, value in pool_gauges():
+            lines += exposition(name, 'gauge', help, [(name, {}, value)])
+        lines += exposition('fyyur_response_cache_requests_total', 'counter',
+                            'Response cache lookups per endpoint.', cache_samples())
+        return Response(''.join(lines), mimetype='text/plain; version=0.0.4')
+
+
+def pool_gauges():
+    pool = current_app.extensions['sqlalchemy'].db.engine.pool
+    if not isinstance(pool, QueuePool):
+        return []
+    return [
+        ('fyyur_db_pool_size', 'Connections the pool keeps open.', pool.size()),
+        ('fyyur_db_pool_checked_out', 'Connections in use.', pool.checkedout()),
+        ('fyyur_db_pool_checked_in', 'Idle connections in the pool.', pool.checkedin()),
+        ('fyyur_db_pool_overflow', 'Connections opened beyond the pool size (negative : room left).',
+         pool.overflow()),
+    ]
+
+
+def cache_samples():
+    cache = current_app.extensions.get('response_cache')
+    if cache is None:
+        return []
+    return [
+        ('fyyur_response_cache_requests_total', {'endpoint': endpoint, 'result': result}, count)
+        for endpoint, stats in cache.stats().items()
+        for result, count in (('hit', stats['hits']), ('miss', stats['misses']))
+    ]
+
+
+def exposition(name, kind, help, samples):
+    lines = [f'# HELP {name} {help}\n', f'# TYPE {name} {kind}\n']
+    for sample, labels, value in samples:
+        if labels:
+            labels = ','.join(f'{key}="{escape(value)}"' for key, value in labels.items())
+            lines.append(f'{sample}{{{labels}}} {value}\n')
+        else:
+            lines.append(f'{sample} {value}\n')
+    return lines
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,166 @@
+# ----------------------------------------------------------------------------#
+# Profiler : samples the stack of a request and writes it as collapsed stacks,
+# the input of flamegraph.pl and speedscope.
+#
+# Off unless PROFILING is set. Then a request is profiled when it sends an
+# X-Profile header or a _profile=1 query argument, and PROFILE_SAMPLE_RATE of
+# the others are. A thread samples the stack of the request every
+# PROFILE_INTERVAL_MS until teardown, so a streamed page includes rendering
+# its body. Every sample is put in the category of the innermost frame that
+# has one : database driver, ORM, Jinja rendering or the format_datetime
+# filter. PROFILE_DIR receives <time>-<endpoint>.folded, one "frame;frame
+# samples" line per stack, and a .json summary with the time per category.
+# ----------------------------------------------------------------------------#
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request
+
+# innermost matching frame wins : a query run from a template is database time
+CATEGORIES = [
+    ('format_datetime', lambda code: code.co_name in ('format_datetime', 'cached_format_datetime')
+        and code.co_filename.endswith(os.path.join('utils', '__init__.py'))),
+    ('db', lambda code: os.path.join('sqlalchemy', 'engine', '') in code.co_filename
+        or os.path.join('sqlalchemy', 'pool', '') in code.co_filename
+        or 'psycopg2' in code.co_filename),
+    ('orm', lambda code: os.path.join('sqlalchemy', '') in code.co_filename
+        or 'flask_sqlalchemy' in code.co_filename),
+    ('jinja', lambda code: os.path.join('jinja2', '') in code.co_filename
+        or code.co_filename.endswith('.html')),
+]
+OTHER = 'other'
+
+
+class Sampler(threading.Thread):
+    """Counts the stacks of another thread every ``interval`` seconds."""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[stack(frame)] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+class Profiler:
+    """Flask extension sampling the requests asked for or picked at random."""
+
+    def __init__(self, app=None):
+        self.directory = None
+        self.rate = None
+        self.interval = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('PROFILING'):
+            return
+        self.directory = app.config['PROFILE_DIR']
+        self.rate = app.config['PROFILE_SAMPLE_RATE']
+        self.interval = app.config['PROFILE_INTERVAL_MS'] / 1000
+        os.makedirs(self.directory, exist_ok=True)
+
+        app.before_request(self.start)
+        app.after_request(self.add_header)
+        app.teardown_request(self.finish)
+        app.extensions['profiler'] = self
+
+    def start(self):
+        asked = 'X-Profile' in request.headers or request.args.get('_profile') == '1'
+        if not (asked or random.random() < self.rate):
+            return
+        g.profile_name = '%s-%s' % (time.strftime('%Y%m%dT%H%M%S'), request.endpoint or 'unmatched')
+        g.profile_started = time.perf_counter()
+        g.profile_sampler = Sampler(threading.get_ident(), self.interval)
+        g.profile_sampler.start()
+
+    def add_header(self, response):
+        if 'profile_sampler' in g:
+            response.headers['X-Profile'] = g.profile_name
+        return response
+
+    def finish(self, exception=None):
+        # at teardown, after a streamed body has been sent
+        sampler = g.pop('profile_sampler', None)
+        if sampler is None:
+            return
+        sampler.stop()
+        elapsed = time.perf_counter() - g.profile_started
+        path = os.path.join(self.directory, g.profile_name)
+        # two requests of an endpoint in the same second
+        suffix = 1
+        while os.path.exists(path + '.folded'):
+            suffix += 1
+            path = os.path.join(self.directory, f'{g.profile_name}-{suffix}')
+
+        with open(path + '.folded', 'w') as f:
+            for frames, samples in sampler.stacks.most_common():
+                f.write(';'.join(label(code) for code in frames) + f' {samples}\n')
+        with open(path + '.json', 'w') as f:
+            json.dump(summary(sampler.stacks, elapsed, self.interval), f, indent=2)
+            f.write('\n')
+
+
+def stack(frame):
+    # code objects from the outermost frame in
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    return tuple(reversed(codes))
+
+
+def category(frames):
+    for code in reversed(frames):
+        for name, matches in CATEGORIES:
+            if matches(code):
+                return name
+    return OTHER
+
+
+def label(code):
+    # function (file:line), with site-packages and the checkout stripped from the file
+    filename = code.co_filename
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            filename = filename[len(prefix) + 1:]
+            break
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ',')
+
+
+def summary(stacks, elapsed, interval):
+    # sampled time per category, scaled to the measured duration
+    samples = sum(stacks.values())
+    split = Counter()
+    for frames, count in stacks.items():
+        split[category(frames)] += count
+    queries = g.get('sql_queries')
+    return {
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        'duration_ms': round(elapsed * 1000, 2),
+        'interval_ms': interval * 1000,
+        'samples': samples,
+        'split_ms': {
+            name: round(split[name] / samples * elapsed * 1000, 2) if samples else 0
+            for name in [name for name, _ in CATEGORIES] + [OTHER]
+        },
+        # exact, from the SQL instrumentation, next to the sampled db time
+        'sql': {'queries': queries.count, 'ms': round(queries.seconds * 1000, 2)} if queries else None,
+    }
@@ -0,0 +1,127 @@
+# ----------------------------------------------------------------------------#
+# SQL instrumentation : per request query count, database time, rows fetched
+# and slowest statement.
+#
+# Engine events record every statement run while a request is handled. The
+# totals go out in a Server-Timing header, and a JSON lines log receives the
+# statements slower than SQL_SLOW_QUERY_MS and the statements repeated at
+# least SQL_REPEATED_STATEMENT_THRESHOLD times in one request, the usual
+# sign of an N+1 pattern. Streamed responses run some of their queries after
+# the headers are sent; the log, written at teardown, still counts them.
+# ----------------------------------------------------------------------------#
+import json
+import logging
+import time
+from collections import defaultdict
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('fyyur.sql')
+
+
+class RequestQueries:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0
+        self.rows = 0
+        self.slowest = (0, None)
+        # statement -> [executions, seconds]
+        self.statements = defaultdict(lambda: [0, 0])
+
+    def record(self, statement, seconds, rows):
+        self.count += 1
+        self.seconds += seconds
+        self.rows += max(rows, 0)
+        if seconds > self.slowest[0]:
+            self.slowest = (seconds, statement)
+        executions = self.statements[statement]
+        executions[0] += 1
+        executions[1] += seconds
+
+    def repeated(self, threshold):
+        return [
+            (statement, executions, seconds)
+            for statement, (executions, seconds) in self.statements.items()
+            if executions >= threshold
+        ]
+
+
+class SQLInstrumentation:
+    """Flask extension recording the statements each request runs."""
+
+    def __init__(self, app=None):
+        self.slow_query = None
+        self.repeated_threshold = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.slow_query = app.config['SQL_SLOW_QUERY_MS'] / 1000
+        self.repeated_threshold = app.config['SQL_REPEATED_STATEMENT_THRESHOLD']
+        if app.config.get('SQL_LOG_FILE'):
+            handler = logging.FileHandler(app.config['SQL_LOG_FILE'])
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+        # every engine, the listeners only record inside a request
+        if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        app.before_request(self.start)
+        app.after_request(self.add_server_timing)
+        app.teardown_request(self.log_repeated)
+        app.extensions['sql_instrumentation'] = self
+
+    def start(self):
+        g.sql_queries = RequestQueries()
+        g.sql_started = time.perf_counter()
+        g.sql_slow_query = self.slow_query
+
+    def add_server_timing(self, response):
+        queries = g.get('sql_queries')
+        if queries is None:
+            return response
+        total = (time.perf_counter() - g.sql_started) * 1000
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={queries.seconds * 1000:.2f};desc="{queries.count} queries, {queries.rows} rows"'
+        )
+        response.headers.add('Server-Timing', f'app;dur={total:.2f}')
+        return response
+
+    def log_repeated(self, exception=None):
+        queries = g.get('sql_queries')
+        if queries is None:
+            return
+        for statement, executions, seconds in queries.repeated(self.repeated_threshold):
+            log('repeated_statement', executions=executions, duration_ms=round(seconds * 1000, 2),
+                statement=statement)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'sql_queries' in g:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not (has_request_context() and 'sql_queries' in g and conn.info.get('query_started')):
+        return
+    seconds = time.perf_counter() - conn.info['query_started'].pop()
+    g.sql_queries.record(statement, seconds, cursor.rowcount)
+    if seconds >= g.sql_slow_query:
+        log('slow_query', duration_ms=round(seconds * 1000, 2), rows=cursor.rowcount, statement=statement)
+
+
+def log(kind, **fields):
+    # one json object per line, with the request it belongs to
+    logger.warning(json.dumps({
+        'event': kind,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'method': request.method,
+        'path': request.full_path.rstrip('?'),
+        'endpoint': request.endpoint,
+        **fields,
+    }))
@@ -0,0 +1,108 @@
+# ----------------------------------------------------------------------------#
+# Traffic capture : one JSON line per request, the input of bench.replay.
+#
+# Off unless TRAFFIC_CAPTURE is set. A line holds the time the request came
+# in, its method, path and query string, the endpoint, the form or JSON body,
+# and the status, size and duration of the response; written at teardown, so
+# the duration of a streamed page includes sending its body. CSRF tokens and
+# headers are not kept, nor are file uploads and other raw bodies (the line
+# says "body_omitted"). TRAFFIC_CAPTURE_RATE samples a share of the requests.
+# ----------------------------------------------------------------------------#
+import json
+import logging
+import os
+import random
+import time
+
+from flask import g, request
+
+logger = logging.getLogger('fyyur.traffic')
+
+# form fields never written to the capture
+OMITTED_FIELDS = ('csrf_token',)
+
+
+class TrafficCapture:
+    """Flask extension writing the requests it sees to TRAFFIC_CAPTURE_FILE."""
+
+    def __init__(self, app=None):
+        self.rate = None
+        self.excluded = ()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('TRAFFIC_CAPTURE'):
+            return
+        self.rate = app.config['TRAFFIC_CAPTURE_RATE']
+        self.excluded = set(app.config['TRAFFIC_CAPTURE_EXCLUDE'])
+        path = app.config['TRAFFIC_CAPTURE_FILE']
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        handler = logging.FileHandler(path)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+        app.before_request(self.start)
+        app.after_request(self.record_response)
+        app.teardown_request(self.write)
+        app.extensions['traffic_capture'] = self
+
+    def start(self):
+        if request.endpoint in self.excluded or random.random() >= self.rate:
+            return
+        g.traffic_time = time.time()
+        g.traffic_started = time.perf_counter()
+
+    def record_response(self, response):
+        if 'traffic_started' in g:
+            g.traffic_response = {'status': response.status_code, 'size': response.content_length}
+            if response.is_streamed:
+                # counted as it is sent, rather than buffered to measure it
+                g.traffic_response['size'] = 0
+                response.response = counted(response.response, response.charset, g.traffic_response)
+        return response
+
+    def write(self, exception=None):
+        if 'traffic_started' not in g:
+            return
+        sent = g.get('traffic_response', {'status': 500, 'size': None})
+        logger.info(json.dumps({
+            'time': round(g.traffic_time, 6),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            **body(),
+            'status': sent['status'],
+            'size': sent['size'],
+            'duration_ms': round((time.perf_counter() - g.traffic_started) * 1000, 2),
+        }))
+
+
+def counted(chunks, charset, sent):
+    # the chunks of a streamed body, encoded, adding their length to sent['size']
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            sent['size'] += len(chunk)
+            yield chunk
+    finally:
+        # closing a stream_with_context body ends its request
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def body():
+    # what replay needs to send the same request again
+    if request.files or (request.content_length and not (request.form or request.is_json)):
+        return {'body_omitted': True}
+    if request.is_json:
+        return {'json': request.get_json(silent=True)}
+    if request.form:
+        return {'form': {
+            name: values for name, values in request.form.to_dict(flat=False).items()
+            if name not in OMITTED_FIELDS
+        }}
+    return {}
@@ -2,23 +2,58 @@
 # Filters.
 # ----------------------------------------------------------------------------#
 from datetime import datetime
+from functools import lru_cache
 
-import babel
-import dateutil
+import babel.dates
+import dateutil.parser
+from flask import current_app, g, has_request_context, request
+
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+# babel patterns are parsed once per format instead of on every call
+DATETIME_PATTERNS = {name: babel.dates.parse_pattern(pattern) for name, pattern in DATETIME_FORMATS.items()}
+
+DEFAULT_LOCALE = 'en'
 
 
 def format_datetime(value, format='medium'):
-    # convert only if value is not a datetime object
-    if not isinstance(value, datetime):
-        date = dateutil.parser.parse(value)
-    else:
+    return cached_format_datetime(value, format, request_locale())
+
+
+@lru_cache(maxsize=4096)
+def cached_format_datetime(value, format, locale):
+    # convert only if value is not a datetime object, ISO strings skip dateutil
+    if isinstance(value, datetime):
         date = value
+    else:
+        try:
+            date = datetime.fromisoformat(value)
+        except ValueError:
+            date = dateutil.parser.parse(value)
+
+    pattern = DATETIME_PATTERNS.get(format)
+    if pattern is None:
+        # babel's own format names ('short', 'long', ...) or a raw pattern
+        return babel.dates.format_datetime(date, format, locale=locale)
+    return pattern.apply(date, get_locale(locale))
+
+
+@lru_cache(maxsize=None)
+def get_locale(locale):
+    return babel.Locale.parse(locale)
+
 
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format, locale='en')
+def request_locale():
+    # the best match of Accept-Language among LANGUAGES, resolved once per request
+    if not has_request_context():
+        return DEFAULT_LOCALE
+    if 'locale' not in g:
+        languages = current_app.config.get('LANGUAGES', [DEFAULT_LOCALE])
+        g.locale = request.accept_languages.best_match(languages, default=languages[0])
+    return g.locale
 
 
 def timedelta(duration):